@@ -0,0 +1,86 @@
+"""
+Define a background asset loader here.
+Image decoding and mesh generation run on a thread pool, their GL uploads are applied on the render thread
+a bounded number of bytes per frame, so building a heavy scene doesn't freeze the window.
+First version in 10/18/2026
+
+:version: 2026.1.1
+"""
+
+import collections
+import concurrent.futures
+import os
+
+
+class AssetLoader:
+    """
+    Thread pool for CPU work of assets, plus the queue of GL uploads waiting for the render thread.
+    Until start is called, work and upload both run right away on the calling thread.
+    """
+    executor = None
+    pending = collections.deque()  # (future, upload) of submitted work whose upload hasn't run yet
+
+    uploadBytesPerFrame = 8 * 2 ** 20  # drain stops once a frame uploaded this much, at least one upload runs
+
+    @classmethod
+    def start(cls, maxWorkers=None):
+        """
+        Start the thread pool, later submissions run in the background
+        """
+        if cls.executor is None:
+            maxWorkers = maxWorkers or min(4, os.cpu_count() or 1)
+            cls.executor = concurrent.futures.ThreadPoolExecutor(maxWorkers, thread_name_prefix="AssetLoader")
+
+    @classmethod
+    def stop(cls):
+        """
+        Stop the thread pool, work not started yet is cancelled and waiting uploads are dropped
+        """
+        if cls.executor is not None:
+            cls.executor.shutdown(wait=False, cancel_futures=True)
+            cls.executor = None
+        cls.pending.clear()
+
+    @classmethod
+    def submit(cls, work, upload):
+        """
+        Run work on the pool, then upload with its result on the render thread, from drain
+
+        :param work: called without arguments on a worker thread, must not call GL
+        :param upload: called with the result of work on the render thread, returns the number of bytes it uploaded
+        :rtype: concurrent.futures.Future
+        """
+        if cls.executor is None:
+            future = concurrent.futures.Future()
+            future.set_result(work())
+            upload(future.result())
+            return future
+        future = cls.executor.submit(work)
+        cls.pending.append((future, upload))
+        return future
+
+    @classmethod
+    def drain(cls, byteBudget=None):
+        """
+        Apply the uploads of finished work, oldest first, until byteBudget bytes were uploaded in this call.
+        Call once per frame on the render thread with the GL context current.
+        A failure of the work is raised here.
+
+        :return: number of uploads still waiting
+        """
+        byteBudget = cls.uploadBytesPerFrame if byteBudget is None else byteBudget
+        uploaded = 0
+        waiting = collections.deque()
+        try:
+            while cls.pending:
+                future, upload = cls.pending.popleft()
+                if future.cancelled():
+                    continue
+                if not future.done() or uploaded >= byteBudget:
+                    waiting.append((future, upload))
+                    continue
+                uploaded += upload(future.result())
+        finally:
+            waiting.extend(cls.pending)
+            cls.pending = waiting
+        return len(waiting)
@@ -10,7 +10,6 @@ import math
 import os
 
 import numpy as np
-from PIL import Image
 
 import GLBuffer
 from Material import Material
@@ -20,6 +19,7 @@ from Displayable import Displayable
 from Quaternion import Quaternion
 from GLUtility import GLUtility
 from GLBuffer import Texture
+from TextureCache import TextureCache
 
 try:
     import OpenGL
@@ -87,6 +87,10 @@ class Component:
 
     glUtility = None
 
+    # shared by all components: (camera position, pixels covered by one world unit at distance 1), used to pick
+    # the level of detail. None draws every Displayable at full detail
+    lodView = None
+
     def __init__(self, position, display_obj=None):
         """
         Init Component
@@ -144,12 +148,21 @@ class Component:
 
     def clear(self):
         """
-        remove all children and destroy them
+        remove all children and destroy them, giving back their meshes and textures
         """
         for c in self.children:
             c.clear()
-            self.children.remove(c)
-            del c
+            c.release()
+        self.children = []
+
+    def release(self):
+        """
+        Give back the GPU resources of this component only: the shared meshes of its Displayable and its texture.
+        Neither can be drawn afterwards.
+        """
+        if isinstance(self.displayObj, Displayable):
+            self.displayObj.release()
+        self.releaseTexture()
 
     def initialize(self):
         """
@@ -167,8 +180,32 @@ class Component:
         # use init value to generate transformation matrix for all children
         self.update()
 
+    @staticmethod
+    def setLODView(cameraPos, pixelsPerUnit):
+        """
+        Set the camera used to pick levels of detail in this frame
+
+        :param cameraPos: camera position in world coordinates
+        :param pixelsPerUnit: screen pixels covered by one world unit at distance 1 from the camera
+        """
+        Component.lodView = (np.array(cameraPos, dtype=float), pixelsPerUnit)
+
+    def projectedRadius(self, radius):
+        """
+        Approximate screen radius, in pixels, of a sphere with this radius around the component's origin
+        """
+        cameraPos, pixelsPerUnit = self.lodView
+        # matrices are stored transposed, the origin lands on the last row and the uniform scaling is a row length
+        center = self.transformationMat[3, 0:3]
+        scale = np.linalg.norm(self.transformationMat[0, 0:3])
+        distance = max(np.linalg.norm(center - cameraPos), 1e-6)
+        return radius * scale * pixelsPerUnit / distance
+
     def draw(self, shaderProg):
         if isinstance(self.displayObj, Displayable):
+            lodMeshes = self.displayObj.lodMeshes
+            if self.lodView is not None and lodMeshes is not None and len(lodMeshes) > 1:
+                self.displayObj.selectLOD(self.projectedRadius(lodMeshes[0].boundingRadius))
             shaderProg.setMat4("modelMat", self.transformationMat)
             shaderProg.setVec4("diffuse", self.material.diffuse)
             shaderProg.setVec4("specular", self.material.specular)
@@ -177,10 +214,11 @@ class Component:
             shaderProg.setFragmentShaderRouting(self.renderingRouting)
             if self.textureOn:
                 shaderProg.use()
-                self.texture.bind(shaderProg.getUniformLocation("textureImage"))
+                TextureCache.touch(self.texture)
+                self.texture.bindProgram(shaderProg)
             else:
                 shaderProg.use()
-                self.texture.unbind(shaderProg.getUniformLocation("textureImage"))
+                self.texture.unbindProgram(shaderProg)
             self.displayObj.draw()
 
         for c in self.children:
@@ -302,11 +340,18 @@ class Component:
             raise TypeError("Image File doesn't exist")
 
         shaderProg.use()
-        texture_image = Image.open(imgFilePath).convert("RGB")
-        texture_image = np.array(texture_image, dtype=np.uint8)
-        self.texture.setTextureImage(texture_image)
+        # components texturing with the same file share one texture
+        texture = TextureCache.acquire(imgFilePath)
+        self.releaseTexture()
+        self.texture = texture
         self.textureOn = textureOn
 
+    def releaseTexture(self):
+        if self.texture.key is not None:
+            TextureCache.release(self.texture)
+        else:
+            self.texture.delete()
+
     def setMaterial(self, material: Material):
         if not isinstance(material, Material):
             raise TypeError("Error, material must has type Material")
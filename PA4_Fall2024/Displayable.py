@@ -6,11 +6,32 @@ First version in 09/26/2018
 :version: 2021.1.1
 """
 
+import math
+
+from MeshCache import MeshCache
+
 
 class Displayable:
     """
     Interface for displayable object
     """
+    vao = None
+    vbo = None
+    ebo = None
+    color = None
+
+    vertices = None
+    indices = None
+
+    mesh = None  # shared Mesh from MeshCache, the full detail one
+
+    # level of detail chain, finest first. lodMeshes[0] is mesh
+    lodMeshes = None
+    lodSegments = None  # number of segments around the surface for each level
+    lodIndex = 0  # level currently drawn
+    lodPixelsPerSegment = 6  # aim for segments about this many pixels long on screen
+    lodHysteresis = 0.25  # only switch to a coarser level once it is this much finer than needed
+
     def __init__(self):
         pass
 
@@ -19,3 +40,54 @@ class Displayable:
 
     def initialize(self):
         raise NotImplementedError
+
+    def setMesh(self, params, generateFunc):
+        """
+        Take the shared mesh for this object from MeshCache, generating it only if no other Displayable has it.
+        Any mesh held before is released.
+
+        :param params: hashable geometry parameters which, with the class, identify the mesh. The color isn't
+                       part of it, meshes are drawn with the color of the Displayable drawing them
+        :param generateFunc: called without arguments on a cache miss, returns (vertices, indices)
+        """
+        mesh = MeshCache.acquire((type(self), params), generateFunc)
+        self.release()
+        self.mesh = mesh
+        self.vertices, self.indices = mesh.vertices, mesh.indices
+        self.lodMeshes = [mesh]
+        self.lodSegments = [math.inf]
+        self.lodIndex = 0
+
+    def addLOD(self, params, generateFunc, segments):
+        """
+        Append a coarser tessellation to the level of detail chain. Call after setMesh, coarsest last.
+
+        :param segments: number of segments around the surface at this level, used to pick the level on screen
+        """
+        self.lodMeshes.append(MeshCache.acquire((type(self), params), generateFunc))
+        self.lodSegments.append(segments)
+
+    def selectLOD(self, pixelRadius):
+        """
+        Pick the level to draw for an object whose bounding sphere covers pixelRadius pixels on screen.
+        A finer level is taken as soon as the current one is too coarse, a coarser one only when it is
+        comfortably enough, so the level doesn't flicker around a threshold.
+        """
+        needed = 2 * math.pi * pixelRadius / self.lodPixelsPerSegment
+        level = self.lodIndex
+        while level > 0 and self.lodSegments[level] < needed:
+            level -= 1
+        while level + 1 < len(self.lodMeshes) and self.lodSegments[level + 1] * (1 - self.lodHysteresis) >= needed:
+            level += 1
+        self.lodIndex = level
+
+    def release(self):
+        """
+        Give back the shared meshes
+        """
+        for mesh in self.lodMeshes or []:
+            MeshCache.release(mesh)
+        self.mesh = None
+        self.lodMeshes = None
+        self.lodSegments = None
+        self.lodIndex = 0
@@ -7,7 +7,6 @@ First version in 10/20/2021
 """
 
 from Displayable import Displayable
-from GLBuffer import VAO, VBO, EBO
 import numpy as np
 import ColorType
 
@@ -57,10 +56,6 @@ class DisplayableCube(Displayable):
         self.shaderProg = shaderProg
         self.shaderProg.use()
 
-        self.vao = VAO()
-        self.vbo = VBO()  # vbo can only be initiate with glProgram activated
-        self.ebo = EBO()
-
         self.generate(length, width, height, color)
 
     def generate(self, length=1, width=1, height=1, color=None):
@@ -69,10 +64,14 @@ class DisplayableCube(Displayable):
         self.height = height
         self.color = color
 
-        self.vertices = np.zeros([36, 11])
+        # identical cubes (e.g. light markers) share one mesh
+        self.setMesh((length, width, height), lambda: self.generate_cube_mesh(length, width, height, color))
+
+    @staticmethod
+    def generate_cube_mesh(length, width, height, color):
         # TODO 1.1 rewrite vertices and self.indices
 
-        vl = np.array([
+        vertices = np.array([
             # back face
             -length / 2, -width / 2, -height / 2, 0, 0, -1, *color, 0, 0,
             -length / 2, width / 2, -height / 2, 0, 0, -1, *color, 0, 1,
@@ -119,38 +118,19 @@ class DisplayableCube(Displayable):
             -length / 2, -width / 2, -height / 2, 0, -1, 0, *color, 0, 0,
             length / 2, -width / 2, height / 2, 0, -1, 0, *color, 1, 1,
             -length / 2, -width / 2,height / 2, 0, -1, 0, *color, 0, 1,
-        ]).reshape((36, 11))
-
-        self.vertices[0:36, 0:11] = vl
-
+        ], dtype=np.float32).reshape((36, 11))
 
-        self.indices = np.array([x for x in range(36)])
+        indices = np.arange(36, dtype=np.uint32).reshape((12, 3))  # triangle list
+        return vertices, indices
 
 
     def draw(self):
-        self.vao.bind()
         # TODO 1.1 is at here, switch from vbo to ebo
-        # self.vbo.draw()
-        self.ebo.draw()
-        self.vao.unbind()
+        self.mesh.draw(self.color)
 
     def initialize(self):
         """
-        Remember to bind VAO before this initialization. If VAO is not bind, program might throw an error
-        in systems that don't enable a default VAO after GLProgram compilation
+        Upload the shared mesh, it is a no-op if another Displayable has already uploaded it.
+        Attribute pointers for position, normal, color and texture coordinates are set in Mesh.initialize
         """
-        self.vao.bind()
-        self.vbo.setBuffer(self.vertices, 11)
-        self.ebo.setBuffer(self.indices)
-
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexPos"),
-                                  stride=11, offset=0, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexNormal"),
-                                  stride=11, offset=3, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexColor"),
-                                  stride=11, offset=6, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexTexture"),
-                                  stride=11, offset=9, attribSize=2)
-        # TODO/BONUS 6.1 is at here, you need to set attribPointer for texture coordinates
-        # you should check the corresponding variable name in GLProgram and set the pointer
-        self.vao.unbind()
+        self.mesh.initialize(self.shaderProg)
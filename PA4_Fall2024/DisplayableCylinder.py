@@ -7,8 +7,10 @@ First version in 11/01/2021
 """
 from inspect import stack
 
-from Displayable import Displayable
-from GLBuffer import VAO, VBO, EBO
+import functools
+
+from DisplayableParametric import DisplayableParametric
+from GLBuffer import EBO
 from Point import Point
 import numpy as np
 import ColorType
@@ -39,13 +41,8 @@ except ImportError:
     raise ImportError("Required dependency PyOpenGL not present")
 
 
-class DisplayableCylinder(Displayable):
-    vao = None
-    vbo = None
-    ebo = None
-    shaderProg = None
-
-    # stores current torus's information, read-only
+class DisplayableCylinder(DisplayableParametric):
+    # stores current cylinder's information, read-only
     stacks = 0
     slices = 0
     radiusX = 0
@@ -53,18 +50,8 @@ class DisplayableCylinder(Displayable):
     radiusZ = 0
     color = None
 
-    vertices = None
-    indices = None
-
     def __init__(self, shaderProg, radiusX=0.5, radiusY = 0.5, Z=0.5, stacks=18, slices=36, color=ColorType.PINK):
-        super(DisplayableCylinder, self).__init__()
-        self.shaderProg = shaderProg
-        self.shaderProg.use()
-
-        self.vao = VAO()
-        self.vbo = VBO()  # vbo can only be initiate with glProgram activated
-        self.ebo = EBO()
-
+        super(DisplayableCylinder, self).__init__(shaderProg)
         self.generate(radiusX, radiusY, Z, stacks, slices, color)
 
     def generate(self, radiusX=0.5, radiusY=0.5, radiusZ=0.5, stacks=18, slices=36, color=ColorType.SOFTBLUE):
@@ -75,113 +62,81 @@ class DisplayableCylinder(Displayable):
         self.slices = slices
         self.color = color
 
-        # we need to pad two more rows for poles and one more column for slice seam, to assign correct texture coord
-        # self.vertices = np.zeros([(stacks) * (slices), 11])
-        self.vertices = self.generate_cylinder_vertices(radiusX, radiusY, radiusZ, stacks, slices, color)
-        self.indices = self.generate_cylinder_indices(stacks, slices)
-
-    def generate_cylinder_vertices(self, radiusX, radiusY, radiusZ, stacks, slices, color):
-        vertices = np.zeros((stacks * slices, 11))
-        arr_stack = np.linspace(radiusZ, -radiusZ, stacks)
-        arr_slice = np.linspace(0, 2 * np.pi, slices, endpoint=False)
-
-        top_center = np.array([[0, 0, radiusZ, 0, 0, 1, *color, 0, 0]])
-        bottom_center = np.array([[0, 0, -radiusZ, 0, 0, -1,*color, 0, 0]])
-
-        index_func = lambda i, j: i * slices + j
-
-        for i, z in enumerate(arr_stack):
-            for j, theta in enumerate(arr_slice):
-                # vertice position
-                x = radiusX * np.cos(theta)
-                y = radiusY * np.sin(theta)
-
-                # norm（针对侧面）
-                nx = np.cos(theta)
-                ny = np.sin(theta)
-                nz = 0
-
-                # texture pos (u, v)
-                u = j / slices
-                v = i / stacks
-
-                # idx
-                k = index_func(i, j)
-                vertices[k] = np.array([x, y, z, nx, ny, nz, *color, u, v])
-        # top circle vertices
-        top_vertices =  np.zeros((slices, 11))
-        for j, theta in enumerate(arr_slice):
-            x = radiusX * np.cos(theta)
-            y = radiusY * np.sin(theta)
-            z = radiusZ
-            nx, ny, nz = 0, 0, 1
-            top_vertices[j] = np.array([x, y, z, nx, ny, nz, *color, u, v])
-        # bottom circle vertices
-        bottom_vertices = np.zeros((slices, 11))
-        for j, theta in enumerate(arr_slice):
-            x = radiusX * np.cos(theta)
-            y = radiusY * np.sin(theta)
-            z = -radiusZ
-            nx, ny, nz = 0, 0, -1
-            bottom_vertices[j] = np.array([x, y, z, nx, ny, nz, *color, u, v])
-
-        all_vertices = np.concatenate([top_center, top_vertices,  vertices, bottom_vertices,  bottom_center ], axis=0)
-        return all_vertices
-
-    def generate_cylinder_indices(self, stacks, slices):
-        indices = []
-
-        # middle index
-        for i in range(stacks-1):
-            for j in range(slices):
-                offset = 1 + slices
-                current = i * slices + j + offset
-                next_stack = (i + 1) * slices + j + offset
-                next_slice = i * slices + (j + 1) % slices + offset  # net slice
-                next_next_stack = (i + 1) * slices + (j + 1) % slices + offset  # next stack
-
-                # two triangles
-                indices.append([current, next_stack, next_slice])  # first triangle
-                indices.append([next_stack, next_next_stack, next_slice])  # second triangle
-
-
-        top_center = 0
-        bottom_center = (stacks + 2) * slices + 2 - 1
-
-        for j in range(slices):
-            current = j
-            next = (j + 1) % slices
-            offset_top = 1
-            indices.append([top_center , current + offset_top, next + offset_top])
-
-        for j in range(slices):
-            current = j
-            next = (j + 1) % slices
-            offset_bottom = 1 + slices * (stacks + 1)
-            indices.append([bottom_center, current + offset_bottom, next + offset_bottom])
-
-        return np.array(indices)
-
-    def draw(self):
-        self.vao.bind()
-        self.ebo.draw()
-        self.vao.unbind()
-
-    def initialize(self):
+        # generation may run later on a worker thread, it only uses these arguments, never self
+        strips = self.triangleStrips
+        self.setMeshChain(lambda stacks, slices: (
+            (radiusX, radiusY, radiusZ, stacks, slices),
+            lambda: self.generate_cylinder_mesh(radiusX, radiusY, radiusZ, stacks, slices, color, strips)),
+            (stacks, slices), (2, 3))
+
+    def generate_cylinder_mesh(self, radiusX, radiusY, radiusZ, stacks, slices, color, strips=False):
         """
-        Remember to bind VAO before this initialization. If VAO is not bind, program might throw an error
-        in systems which don't enable a default VAO after GLProgram compilation
+        Build the side, both caps and the cap centers straight into one float32 buffer.
+        Vertex rows are laid out as: top center, top ring, side (stacks * (slices + 1)), bottom ring, bottom center.
+        Each row is position(3) + normal(3) + color(3) + texture coordinate(2).
+
+        :param strips: return triangle strips split by EBO.primitiveRestart instead of triangles
+        :return: float32 vertices of shape (stacks * (slices + 1) + 2 * slices + 2, 11)
+                 and uint32 indices of shape (n, 3), or of shape (n,) for strips
         """
-        self.vao.bind()
-        self.vbo.setBuffer(self.vertices, 11)
-        self.ebo.setBuffer(self.indices)
-
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexPos"),
-                                  stride=11, offset=0, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexNormal"),
-                                  stride=11, offset=3, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexColor"),
-                                  stride=11, offset=6, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexTexture"),
-                                  stride=11, offset=9, attribSize=2)
-        self.vao.unbind()
+        sideCount = stacks * (slices + 1)
+        vertices = np.empty((sideCount + 2 * slices + 2, 11), dtype=np.float32)
+        topCenter, bottomCenter = 0, vertices.shape[0] - 1
+        sideStart = 1 + slices
+        bottomStart = sideStart + sideCount
+
+        # side, u = z walks from top to bottom, v = theta wraps around the z axis
+        position = functools.partial(self.cylinderPosition, radiusX, radiusY)
+        _, sideIndices = self.generateSurface(position, self.cylinderNormal, stacks - 1, slices,
+                                              (radiusZ, -radiusZ), (0, 2 * np.pi), False, True, color,
+                                              texcoordFunc=lambda s, t: (t, s), indexOffset=sideStart,
+                                              out=vertices[sideStart:bottomStart], strips=strips)
+
+        # caps share the rim positions of the side, with planar texture coordinates
+        theta = np.linspace(0, 2 * np.pi, slices, endpoint=False)
+        cosTheta, sinTheta = np.cos(theta), np.sin(theta)
+        vertices[:sideStart, 6:9] = tuple(color)
+        vertices[bottomStart:, 6:9] = tuple(color)
+        for cap, z in ((vertices[1:sideStart], radiusZ), (vertices[bottomStart:bottomCenter], -radiusZ)):
+            cap[:, 0] = radiusX * cosTheta
+            cap[:, 1] = radiusY * sinTheta
+            cap[:, 2] = z
+            cap[:, 3:5] = 0
+            cap[:, 5] = np.sign(z)
+            cap[:, 9] = 0.5 + 0.5 * cosTheta
+            cap[:, 10] = 0.5 + 0.5 * sinTheta
+        vertices[topCenter, 0:6] = [0, 0, radiusZ, 0, 0, 1]
+        vertices[bottomCenter, 0:6] = [0, 0, -radiusZ, 0, 0, -1]
+        vertices[[topCenter, bottomCenter], 9:11] = 0.5
+
+        # caps, a fan around each center
+        ring = np.arange(slices, dtype=np.uint32)
+        if strips:
+            # center, r0, center, r1, ...: every other triangle is degenerate, the rest are the fan triangles.
+            # The bottom fan walks the ring backwards, it is seen from below
+            capStrips = np.empty((2, 2 * slices + 3), dtype=np.uint32)
+            capStrips[:, 0:-1:2] = [[topCenter], [bottomCenter]]
+            capStrips[0, 1:-1:2] = np.append(ring, 0) + np.uint32(1)
+            capStrips[1, 1:-1:2] = np.append(0, ring[::-1]) + np.uint32(bottomStart)
+            capStrips[:, -1] = EBO.primitiveRestart
+            return vertices, np.concatenate([sideIndices, np.array([EBO.primitiveRestart], dtype=np.uint32),
+                                            capStrips.reshape(-1)[:-1]])
+
+        nextRing = (ring + 1) % slices
+        capIndices = np.empty((2, slices, 3), dtype=np.uint32)
+        capIndices[0, :, 0] = topCenter
+        capIndices[0, :, 1] = ring + 1
+        capIndices[0, :, 2] = nextRing + 1
+        capIndices[1, :, 0] = bottomCenter
+        capIndices[1, :, 1] = nextRing + bottomStart
+        capIndices[1, :, 2] = ring + bottomStart
+
+        return vertices, np.concatenate([sideIndices, capIndices.reshape(2 * slices, 3)])
+
+    @staticmethod
+    def cylinderPosition(radiusX, radiusY, z, theta):
+        return radiusX * np.cos(theta), radiusY * np.sin(theta), z
+
+    @staticmethod
+    def cylinderNormal(z, theta):
+        return np.cos(theta), np.sin(theta), np.zeros_like(z)
@@ -0,0 +1,266 @@
+"""
+Define a Displayable for parametric surfaces here.
+A parametric surface is sampled on a regular (u, v) grid, so torus, ellipsoid and cylinder side share one builder.
+First version in 10/18/2026
+
+:version: 2026.1.1
+"""
+
+from Displayable import Displayable
+from GLBuffer import EBO
+import MeshOptimizer
+import numpy as np
+import ColorType
+
+try:
+    import OpenGL
+
+    try:
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+    except ImportError:
+        from ctypes import util
+
+        orig_util_find_library = util.find_library
+
+
+        def new_util_find_library(name):
+            res = orig_util_find_library(name)
+            if res:
+                return res
+            return '/System/Library/Frameworks/' + name + '.framework/' + name
+
+
+        util.find_library = new_util_find_library
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+except ImportError:
+    raise ImportError("Required dependency PyOpenGL not present")
+
+
+class DisplayableParametric(Displayable):
+    """
+    Base class for surfaces given by vectorized functions of (u, v).
+
+    Subclasses only describe their surface and pass generateSurface to setMeshChain, VAO/VBO/EBO set up,
+    level of detail and drawing are shared.
+    A new surface can also be built directly by passing positionFunc and normalFunc to the constructor.
+    """
+    vao = None
+    vbo = None
+    ebo = None
+    shaderProg = None
+
+    color = None
+
+    vertices = None  # float32 array, every row is position(3) + normal(3) + color(3) + texture coordinate(2)
+    indices = None  # uint32 array of triangles
+
+    lodLevels = 4  # length of the level of detail chain, every level halves the segment counts
+    triangleStrips = False  # emit triangle strips joined by primitive restart instead of triangle lists
+
+    def __init__(self, shaderProg, positionFunc=None, normalFunc=None, uSegments=36, vSegments=36,
+                 uRange=(0, 1), vRange=(0, 1), wrapU=False, wrapV=False, color=ColorType.SOFTBLUE,
+                 flipWinding=False):
+        """
+        :param shaderProg: a compiled GLProgram
+        :param positionFunc: f(u, v) -> (x, y, z), must accept broadcastable numpy arrays
+        :param normalFunc: f(u, v) -> (nx, ny, nz), must accept broadcastable numpy arrays, need not be normalized
+        :param uSegments: number of grid cells along u
+        :param vSegments: number of grid cells along v
+        :param uRange: (start, end) of u
+        :param vRange: (start, end) of v
+        :param wrapU: the surface is closed along u, end of u meets start of u
+        :param wrapV: the surface is closed along v, end of v meets start of v
+        :param flipWinding: see generateSurface
+        """
+        super(DisplayableParametric, self).__init__()
+        self.shaderProg = shaderProg
+        self.shaderProg.use()
+
+        if positionFunc is not None:
+            self.color = color
+            strips = self.triangleStrips
+            self.setMeshChain(lambda uSegments, vSegments: (
+                (positionFunc, normalFunc, uSegments, vSegments, tuple(uRange), tuple(vRange), wrapU, wrapV,
+                 flipWinding),
+                lambda: self.generateSurface(positionFunc, normalFunc, uSegments, vSegments, uRange, vRange,
+                                             wrapU, wrapV, color, strips=strips, flipWinding=flipWinding)),
+                (uSegments, vSegments), (3 if wrapU else 1, 3 if wrapV else 1))
+
+    def setMeshChain(self, meshFunc, segments, minimums):
+        """
+        Build the level of detail chain: full detail first, then every level halves all segment counts.
+        Levels are shared through MeshCache like any other mesh.
+
+        :param meshFunc: f(*segments) -> (params, generateFunc) of the mesh with those segment counts.
+                         generateFunc must follow self.triangleStrips
+        :param segments: segment counts at full detail, e.g. (rings, nsides)
+        :param minimums: the lowest segment count allowed for each entry of segments
+        """
+        def levelMesh(counts):
+            params, generateFunc = meshFunc(*counts)
+            if self.triangleStrips:
+                params = params + ("triangleStrips",)  # strips and triangle lists are different meshes
+            return params, generateFunc
+
+        self.setMesh(*levelMesh(segments))
+        previous = segments
+        for level in range(1, self.lodLevels):
+            coarser = tuple(max(low, count >> level) for count, low in zip(segments, minimums))
+            if coarser == previous:
+                break
+            self.addLOD(*levelMesh(coarser), max(coarser))
+            previous = coarser
+
+    @staticmethod
+    def generateSurface(positionFunc, normalFunc, uSegments, vSegments, uRange=(0, 1), vRange=(0, 1),
+                        wrapU=False, wrapV=False, color=ColorType.SOFTBLUE, texcoordFunc=None,
+                        indexOffset=0, out=None, strips=False, flipWinding=False):
+        """
+        Sample the surface on a (uSegments + 1) x (vSegments + 1) grid in one batched pass, u-major order.
+        A wrapped direction still gets its last row/column, with positions and normals copied from the first one,
+        so the texture coordinate can reach 1 without a seam and without a crack.
+        Triangles with two coincident corners (e.g. at a pole) are dropped.
+
+        :param texcoordFunc: f(s, t) -> (texU, texV), s and t are u and v normalized to [0, 1].
+                             Default maps (s, t) to (texU, texV) directly
+        :param indexOffset: added to every index, for surfaces written after other vertices in a shared buffer
+        :param out: optional float32 array of shape ((uSegments + 1) * (vSegments + 1), 11) to write vertices into
+        :param strips: return one triangle strip per row of cells of every band, split by EBO.primitiveRestart,
+                       instead of triangles. Strips need about a third of the indices; degenerate triangles are kept
+                       in them
+        :param flipWinding: triangles are counter-clockwise seen from the side the derivative along u crossed with
+                            the derivative along v points to. Set it when the normals point to the other side,
+                            so front faces are the outside
+        :return: float32 vertices of shape ((uSegments + 1) * (vSegments + 1), 11) and uint32 indices of shape (n, 3),
+                 or of shape (n,) for strips
+        """
+        uCount, vCount = uSegments + 1, vSegments + 1
+        u = np.linspace(uRange[0], uRange[1], uCount)[:, np.newaxis]
+        v = np.linspace(vRange[0], vRange[1], vCount)[np.newaxis, :]
+        s = np.linspace(0, 1, uCount)[:, np.newaxis]
+        t = np.linspace(0, 1, vCount)[np.newaxis, :]
+
+        # every column is written straight into the float32 output, no full size float64 copy is kept
+        if out is None:
+            out = np.empty((uCount * vCount, 11), dtype=np.float32)
+        vertices = out.reshape(uCount, vCount, 11)
+        position = vertices[..., 0:3]
+        normal = vertices[..., 3:6]
+        for i, p in enumerate(positionFunc(u, v)):
+            position[..., i] = p
+        for i, n in enumerate(normalFunc(u, v)):
+            normal[..., i] = n
+        length = np.linalg.norm(normal, axis=-1, keepdims=True)
+        np.divide(normal, length, out=normal, where=length > 0)
+
+        if wrapU:
+            position[-1] = position[0]
+            normal[-1] = normal[0]
+        if wrapV:
+            position[:, -1] = position[:, 0]
+            normal[:, -1] = normal[:, 0]
+
+        vertices[..., 6:9] = tuple(color)
+        texU, texV = texcoordFunc(s, t) if texcoordFunc is not None else (s, t)
+        vertices[..., 9] = texU
+        vertices[..., 10] = texV
+
+        # two triangles for every grid cell, corners named a(u, v) b(u, v+1) c(u+1, v) d(u+1, v+1)
+        index = np.arange(uCount * vCount, dtype=np.uint32).reshape(uCount, vCount)
+        # cells are emitted in column bands that fit the post-transform vertex cache, see MeshOptimizer.gridCellOrder
+        if strips:
+            # a c b d ... along every row of a band, c a d b ... flipped, same winding as the list but the cells are
+            # split along b-c
+            first, second = (index[1:], index[:-1]) if flipWinding else (index[:-1], index[1:])
+            width = MeshOptimizer.bandWidth()
+            bands = []
+            for start in range(0, vSegments, width):
+                end = min(start + width, vSegments) + 1
+                rows = np.empty((uSegments, 2 * (end - start) + 1), dtype=np.uint32)
+                rows[:, 0:-1:2] = first[:, start:end] + np.uint32(indexOffset)
+                rows[:, 1:-1:2] = second[:, start:end] + np.uint32(indexOffset)
+                rows[:, -1] = EBO.primitiveRestart
+                bands.append(rows.reshape(-1))
+            return out, np.concatenate(bands)[:-1]
+
+        a, b = index[:-1, :-1], index[:-1, 1:]
+        c, d = index[1:, :-1], index[1:, 1:]
+        if flipWinding:
+            triangles = np.stack([c, a, d, a, b, d], axis=-1).reshape(-1, 2, 3)
+        else:
+            triangles = np.stack([c, d, a, a, d, b], axis=-1).reshape(-1, 2, 3)
+        cellOrder = MeshOptimizer.gridCellOrder(uSegments, vSegments)
+
+        # a triangle is degenerate if two of its corners coincide, compare grid neighbours instead of gathering corners
+        sameAlongV = np.all(position[:, :-1] == position[:, 1:], axis=-1)
+        sameAlongU = np.all(position[:-1] == position[1:], axis=-1)
+        sameDiagonal = np.all(position[:-1, :-1] == position[1:, 1:], axis=-1)
+        keep = np.empty((uSegments, vSegments, 2), dtype=bool)
+        keep[..., 0] = ~(sameAlongV[1:] | sameDiagonal | sameAlongU[:, :-1])
+        keep[..., 1] = ~(sameDiagonal | sameAlongU[:, 1:] | sameAlongV[:-1])
+        indices = triangles[cellOrder][keep.reshape(-1, 2)[cellOrder]]
+        if indexOffset:
+            indices += np.uint32(indexOffset)
+        return out, indices
+
+    @staticmethod
+    def inwardFaces(vertices, indices):
+        """
+        Count the triangles wound against their vertex normals, which back face culling would hide from outside.
+        Degenerate triangles are skipped.
+
+        :param indices: triangles of shape (n, 3), or strips split by EBO.primitiveRestart
+        """
+        indices = np.asarray(indices)
+        if indices.ndim == 1:
+            triangles = []
+            for strip in np.split(indices, np.flatnonzero(indices == EBO.primitiveRestart)):
+                strip = strip[strip != EBO.primitiveRestart]
+                if len(strip) < 3:
+                    continue
+                stripTriangles = np.stack([strip[:-2], strip[1:-1], strip[2:]], axis=-1)
+                # every other triangle of a strip is wound the other way round
+                stripTriangles[1::2, 0:2] = stripTriangles[1::2, 1::-1]
+                triangles.append(stripTriangles)
+            indices = np.concatenate(triangles) if triangles else np.empty((0, 3), dtype=np.uint32)
+        position = vertices[:, 0:3].astype(np.float64)
+        p0, p1, p2 = position[indices[:, 0]], position[indices[:, 1]], position[indices[:, 2]]
+        faceNormal = np.cross(p1 - p0, p2 - p0)
+        vertexNormal = vertices[indices, 3:6].sum(axis=1)
+        facing = np.einsum("ij,ij->i", faceNormal, vertexNormal)
+        return int(np.count_nonzero(facing[np.linalg.norm(faceNormal, axis=-1) > 1e-12] < 0))
+
+    def draw(self):
+        self.lodMeshes[self.lodIndex].draw(self.color)
+
+    def initialize(self):
+        """
+        Upload the shared meshes of every level, it is a no-op for those another Displayable has already uploaded
+        """
+        for mesh in self.lodMeshes:
+            mesh.initialize(self.shaderProg)
+
+
+if __name__ == "__main__":
+    # every parametric shape must be wound counter-clockwise seen from where its normals point, at every level
+    from DisplayableCylinder import DisplayableCylinder
+    from DisplayableEllipsoid import DisplayableEllipsoid
+    from DisplayableTorus import DisplayableTorus
+
+    class NoProgram:
+        def use(self):
+            pass
+
+    sphere = lambda u, v: (np.sin(u) * np.cos(v), np.sin(u) * np.sin(v), np.cos(u))
+    for strips in (False, True):
+        DisplayableParametric.triangleStrips = strips
+        for shape in (DisplayableTorus(NoProgram()), DisplayableEllipsoid(NoProgram()), DisplayableCylinder(NoProgram()),
+                      DisplayableParametric(NoProgram(), sphere, sphere, 36, 36, (0, np.pi), (0, 2 * np.pi),
+                                            False, True)):
+            for mesh in shape.lodMeshes:
+                inward = DisplayableParametric.inwardFaces(mesh.vertices, mesh.indices)
+                print(type(shape).__name__, "strips" if strips else "triangles", len(mesh.vertices), "vertices,",
+                      inward, "faces inward")
+                assert inward == 0
@@ -6,8 +6,9 @@ First version in 11/01/2021
 :version: 2021.1.1
 """
 
-from Displayable import Displayable
-from GLBuffer import VAO, VBO, EBO
+import functools
+
+from DisplayableParametric import DisplayableParametric
 from Point import Point
 import numpy as np
 import ColorType
@@ -46,12 +47,7 @@ except ImportError:
 #   “./assets/earth.jpg” for the sphere as the texture image.
 #   There should be no seams in the resulting texture-mapped model.
 
-class DisplayableTorus(Displayable):
-    vao = None
-    vbo = None
-    ebo = None
-    shaderProg = None
-
+class DisplayableTorus(DisplayableParametric):
     # stores current torus's information, read-only
     nsides = 0
     rings = 0
@@ -59,18 +55,8 @@ class DisplayableTorus(Displayable):
     outerRadius = 0
     color = None
 
-    vertices = None
-    indices = None
-
     def __init__(self, shaderProg, innerRadius=0.25, outerRadius=0.5, nsides=36, rings=36, color=ColorType.CYAN):
-        super(DisplayableTorus, self).__init__()
-        self.shaderProg = shaderProg
-        self.shaderProg.use()
-
-        self.vao = VAO()
-        self.vbo = VBO()  # vbo can only be initiate with glProgram activated
-        self.ebo = EBO()
-
+        super(DisplayableTorus, self).__init__(shaderProg)
         self.generate(innerRadius, outerRadius, nsides, rings, color)
 
     def generate(self, innerRadius=0.25, outerRadius=0.5, nsides=36, rings=36, color=ColorType.SOFTBLUE):
@@ -80,86 +66,23 @@ class DisplayableTorus(Displayable):
         self.rings = rings
         self.color = color
 
-        # we need to pad one more row for both nsides and rings, to assign correct texture coord to them
-        self.vertices = np.zeros([(nsides) * (rings), 11])
-        self.vertices = self.generate_torus_vertices(outerRadius, innerRadius, rings, nsides, color)
-
-        self.indices = np.zeros(0)
-        self.indices = self.generate_torus_indices(rings, nsides)
-
-    def generate_torus_vertices(self, outerRadius, innerRadius, rings, nsides, color):
-        # 位置(3) + 法向量(3) + 颜色(3) + 纹理坐标(2)
-        vertices = np.zeros((rings * nsides, 11))
-
-        # angle
-        arr_theta = np.linspace(0,  2*np.pi, rings, endpoint=False)  # 主圆分段
-        arr_phi = np.linspace(0, 2 * np.pi, nsides, endpoint=False)  # 小圆分段
-
-        for i, theta in enumerate(arr_theta):
-            for j, phi in enumerate(arr_phi):
-                # vertices
-                x = (outerRadius + innerRadius * np.sin(phi)) * np.cos(theta)
-                y = (outerRadius + innerRadius * np.sin(phi)) * np.sin(theta)
-                z = innerRadius * np.cos(phi)
-
-                # norm
-                nx = np.sin(phi) * np.cos(theta)
-                ny = np.sin(phi) * np.sin(theta)
-                nz = np.cos(phi)
-
-                # texture (u, v)
-                u = i / (rings - 1)
-                v = j / (nsides - 1)
-
-                # index
-                k = i * nsides + j
-                vertices[k] = np.array([x, y, z, nx, ny, nz, *color, u, v])
-
-        return vertices
-
-    def generate_torus_indices(self, rings, nsides):
-        # 初始化索引列表
-        indices = []
-
-        for i in range(rings):
-            for j in range(nsides):
-                # 当前顶点索引
-                current = i * nsides + j
-                # 右侧顶点索引（环绕到起点）
-                next_side = current + 1 if (j + 1) < nsides else i * nsides
-                # 下一个环上的顶点索引（环绕到起点）
-                next_ring = current + nsides if (i + 1) < rings else j
-                # 对角顶点索引
-                diagonal = next_ring + 1 if (j + 1) < nsides else (i + 1) % rings * nsides
-
-                # 两个三角形
-                indices.append([current, next_side, next_ring])  # 三角形 1
-                indices.append([next_side, diagonal, next_ring])  # 三角形 2
-
-        # 转换为 numpy 数组并返回
-        return np.array(indices, dtype=np.uint32)
-
-    def draw(self):
-        self.vao.bind()
-        self.ebo.draw()
-        self.vao.unbind()
-
-    def initialize(self):
-        """
-        Remember to bind VAO before this initialization. If VAO is not bind, program might throw an error
-        in systems which don't enable a default VAO after GLProgram compilation
-        """
-        self.vao.bind()
-        self.vbo.setBuffer(self.vertices, 11)
-        self.ebo.setBuffer(self.indices)
-
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexPos"),
-                                  stride=11, offset=0, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexNormal"),
-                                  stride=11, offset=3, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexColor"),
-                                  stride=11, offset=6, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexTexture"),
-                                  stride=11, offset=9, attribSize=2)
-
-        self.vao.unbind()
+        # u = theta walks along the main ring, v = phi walks around the tube, both wrap around.
+        # The normal points against d/dtheta x d/dphi, so the winding is flipped to keep the outside in front.
+        # generation may run later on a worker thread, it only uses these arguments, never self
+        position = functools.partial(self.torusPosition, innerRadius, outerRadius)
+        strips = self.triangleStrips
+        self.setMeshChain(lambda rings, nsides: (
+            (innerRadius, outerRadius, nsides, rings),
+            lambda: self.generateSurface(position, self.torusNormal, rings, nsides,
+                                         (0, 2 * np.pi), (0, 2 * np.pi), True, True, color, strips=strips,
+                                         flipWinding=True)),
+            (rings, nsides), (3, 3))
+
+    @staticmethod
+    def torusPosition(innerRadius, outerRadius, theta, phi):
+        tubeDistance = outerRadius + innerRadius * np.sin(phi)
+        return tubeDistance * np.cos(theta), tubeDistance * np.sin(theta), innerRadius * np.cos(phi)
+
+    @staticmethod
+    def torusNormal(theta, phi):
+        return np.sin(phi) * np.cos(theta), np.sin(phi) * np.sin(theta), np.cos(phi)
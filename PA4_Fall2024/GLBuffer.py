@@ -30,9 +30,183 @@ try:
 except ImportError:
     raise ImportError("Required dependency PyOpenGL not present")
 
-import numpy as np
+import bisect
+import collections
 import ctypes
 
+import numpy as np
+
+
+class GLResources:
+    """
+    Registry of the live GL objects created through this module and the bytes allocated for each.
+    Counts should come back to the same values after a scene is replaced, growth means a leak.
+    """
+    live = {}  # kind ("buffer", "vertex array", "texture") -> {GL name: bytes}
+
+    @classmethod
+    def register(cls, kind, name, byteLength=0):
+        """
+        Record a new object, or the new size of a known one
+        """
+        cls.live.setdefault(kind, {})[int(name)] = byteLength
+
+    @classmethod
+    def unregister(cls, kind, name):
+        cls.live.get(kind, {}).pop(int(name), None)
+
+    @classmethod
+    def report(cls):
+        """
+        :return: {kind: (live object count, bytes)}
+        """
+        return {kind: (len(objects), sum(objects.values())) for kind, objects in cls.live.items()}
+
+    @classmethod
+    def summary(cls):
+        return ", ".join(f"{count} {kind} ({byteLength / 2 ** 20:.1f} MB)"
+                         for kind, (count, byteLength) in sorted(cls.report().items()))
+
+    @classmethod
+    def contextLost(cls):
+        """
+        Forget every object and binding of the previous GL context, call before using a new context.
+        The old names must not be deleted, they may already be reused in the new context.
+        """
+        cls.live.clear()
+        GLState.reset()
+        TextureUnits.residents.clear()
+        TextureUnits.unitOf.clear()
+        TextureUnits.arrayResident = 0
+
+
+class GLState:
+    """
+    Cache of the bindings made through this module: program in use, vertex array, buffers, active texture unit,
+    the textures bound in every unit and constant vertex attributes. A call that wouldn't change the state is skipped.
+    Bind only through here (VAO, VBO, EBO, TextureUnits and GLProgram.use do), a direct gl call would be missed.
+    issued and skipped count the calls made and saved, see counters.
+    """
+    program = None
+    vertexArray = 0
+    buffers = {}  # buffer target -> name bound, the element array buffer entry belongs to vertexArray
+    activeUnit = 0
+    textures = {}  # (unit, texture target) -> name bound
+    vertexAttribs = {}  # attribute location -> current value, read by draws with that attribute array disabled
+
+    issued = 0
+    skipped = 0
+
+    @classmethod
+    def useProgram(cls, program):
+        if cls.program == program:
+            cls.skipped += 1
+            return
+        gl.glUseProgram(program)
+        cls.program = program
+        cls.issued += 1
+
+    @classmethod
+    def bindVertexArray(cls, vertexArray):
+        if cls.vertexArray == vertexArray:
+            cls.skipped += 1
+            return
+        gl.glBindVertexArray(vertexArray)
+        cls.vertexArray = vertexArray
+        # the element buffer binding is part of the vertex array, the new one's isn't known
+        cls.buffers.pop(gl.GL_ELEMENT_ARRAY_BUFFER, None)
+        cls.issued += 1
+
+    @classmethod
+    def bindBuffer(cls, target, buffer):
+        if cls.buffers.get(target) == buffer:
+            cls.skipped += 1
+            return
+        gl.glBindBuffer(target, buffer)
+        cls.buffers[target] = buffer
+        cls.issued += 1
+
+    @classmethod
+    def activeTexture(cls, unit):
+        if cls.activeUnit == unit:
+            cls.skipped += 1
+            return
+        gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
+        cls.activeUnit = unit
+        cls.issued += 1
+
+    @classmethod
+    def bindTexture(cls, target, texture):
+        """
+        Bind a texture in the active unit
+        """
+        if cls.textures.get((cls.activeUnit, target)) == texture:
+            cls.skipped += 1
+            return
+        gl.glBindTexture(target, texture)
+        cls.textures[(cls.activeUnit, target)] = texture
+        cls.issued += 1
+
+    @classmethod
+    def vertexAttrib3f(cls, location, value):
+        """
+        Set the current value of a vertex attribute, e.g. the color of a whole mesh
+        """
+        value = tuple(float(c) for c in value)
+        if cls.vertexAttribs.get(location) == value:
+            cls.skipped += 1
+            return
+        gl.glVertexAttrib3f(location, *value)
+        cls.vertexAttribs[location] = value
+        cls.issued += 1
+
+    @classmethod
+    def forgetBuffer(cls, buffer):
+        """
+        A deleted buffer is unbound by GL and its name may come back, stop assuming it is bound
+        """
+        for target in [target for target, name in cls.buffers.items() if name == buffer]:
+            del cls.buffers[target]
+
+    @classmethod
+    def forgetVertexArray(cls, vertexArray):
+        if cls.vertexArray == vertexArray:
+            cls.vertexArray = 0
+            cls.buffers.pop(gl.GL_ELEMENT_ARRAY_BUFFER, None)
+
+    @classmethod
+    def forgetTexture(cls, texture):
+        for key in [key for key, name in cls.textures.items() if name == texture]:
+            del cls.textures[key]
+
+    @classmethod
+    def forgetProgram(cls, program):
+        if cls.program == program:
+            cls.program = None
+
+    @classmethod
+    def counters(cls, reset=False):
+        """
+        :param reset: start counting again from 0, e.g. once per frame
+        :return: (calls issued, calls skipped)
+        """
+        result = (cls.issued, cls.skipped)
+        if reset:
+            cls.issued = cls.skipped = 0
+        return result
+
+    @classmethod
+    def reset(cls):
+        """
+        Forget every binding, e.g. for a new context, the counters are kept
+        """
+        cls.program = None
+        cls.vertexArray = 0
+        cls.buffers.clear()
+        cls.activeUnit = 0
+        cls.textures.clear()
+        cls.vertexAttribs.clear()
+
 
 class VBO:
     """
@@ -41,37 +215,105 @@ class VBO:
     vbo = None
     vertexAttribSize = 0
     vertexNum = 0
+    byteLength = 0  # size of the GPU buffer allocated by the last setBuffer
+    usage = gl.GL_STATIC_DRAW
 
-    def __init__(self):
+    def __init__(self, usage=gl.GL_STATIC_DRAW):
+        """
+        :param usage: gl.GL_STATIC_DRAW for geometry uploaded once, gl.GL_DYNAMIC_DRAW for geometry changed
+                      now and then through update, gl.GL_STREAM_DRAW for geometry rewritten every frame
+        """
         self.vbo = gl.glGenBuffers(1)
+        self.usage = usage
+        GLResources.register("buffer", self.vbo)
 
-    # def __del__(self):
-    #     gl.glDeleteBuffers(1, self.vbo)
+    def delete(self):
+        """
+        Free the GPU buffer, the VBO must not be used afterwards
+        """
+        if self.vbo is not None:
+            gl.glDeleteBuffers(1, [self.vbo])
+            GLState.forgetBuffer(self.vbo)
+            GLResources.unregister("buffer", self.vbo)
+            self.vbo = None
 
     def bind(self):
-        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        GLState.bindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
 
     def setBuffer(self, bufferDataArray: np.ndarray, vertexAttribSize: int):
         """
         :param vertexAttribSize: the size of the vertex attribute
         :type vertexAttribSize: int
-        :param bufferDataArray: the vertices data. It will be flatten in row-major order if its dimension isn't one
+        :param bufferDataArray: the vertices data. It will be flatten in row-major order if its dimension isn't one.
+                                A structured array (packed vertex layout, one record per vertex) is uploaded as is
         :type bufferDataArray: numpy.ndarray
         """
-        # type conversion
-        if bufferDataArray.dtype != np.dtype("float32"):
-            bufferDataArray = bufferDataArray.astype(np.dtype("float32"))
-        bufferData = bufferDataArray.flatten("C")  # flatten in row-major order
+        if bufferDataArray.dtype.names is not None:
+            # packed layout, vertexAttribSize is the record size in 4 bytes words
+            bufferData = np.ascontiguousarray(bufferDataArray).view(np.uint8)
+            self.vertexAttribSize = vertexAttribSize
+            self.vertexNum = bufferDataArray.size
+            self.byteLength = bufferData.nbytes
+
+            self.bind()
+            gl.glBufferData(gl.GL_ARRAY_BUFFER, self.byteLength, bufferData, self.usage)
+            GLResources.register("buffer", self.vbo, self.byteLength)
+            return
+
+        # type conversion and row-major flatten, both without a copy when the array is already C-contiguous float32
+        bufferData = np.ascontiguousarray(bufferDataArray, dtype=np.float32).reshape(-1)
         self.vertexAttribSize = vertexAttribSize
 
-        bufferSize = bufferDataArray.size
+        bufferSize = bufferData.size
         self.vertexNum = bufferSize // vertexAttribSize  # for safety reason, take floor division to get int result
-        byteLength = 4 * bufferSize  # 4 is the size of float32
+        self.byteLength = 4 * bufferSize  # 4 is the size of float32
 
         self.bind()
-        gl.glBufferData(gl.GL_ARRAY_BUFFER, byteLength, bufferData, gl.GL_STATIC_DRAW)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, self.byteLength, bufferData, self.usage)
+        GLResources.register("buffer", self.vbo, self.byteLength)
 
-    def setAttribPointer(self, attribLoc, stride=0, offset=0, attribSize=0):
+    def allocate(self, byteLength, vertexAttribSize):
+        """
+        Allocate an uninitialized buffer of byteLength bytes, to be filled through update
+        """
+        self.vertexAttribSize = vertexAttribSize
+        self.vertexNum = 0
+        self.byteLength = byteLength
+
+        self.bind()
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, self.byteLength, None, self.usage)
+        GLResources.register("buffer", self.vbo, self.byteLength)
+
+    def update(self, offset, array):
+        """
+        Overwrite part of the buffer in place, only the given vertices are sent to the GPU.
+        The buffer must have been allocated by setBuffer and keeps its size.
+
+        :param offset: index of the first vertex to overwrite
+        :param array: whole vertices in the layout given to setBuffer. A float32 (or structured) numpy array
+                      is sent without a copy when C-contiguous, other numpy arrays are converted to float32 first.
+                      Any other buffer-protocol object (bytes, memoryview, array.array) is sent as raw bytes
+        """
+        if not isinstance(array, np.ndarray):
+            bufferData = np.frombuffer(array, dtype=np.uint8)
+        elif array.dtype.names is not None:
+            bufferData = np.ascontiguousarray(array)
+        else:
+            bufferData = np.ascontiguousarray(array, dtype=np.float32)
+
+        byteOffset = offset * 4 * self.vertexAttribSize
+        if byteOffset < 0 or byteOffset + bufferData.nbytes > self.byteLength:
+            raise ValueError(f"Update of {bufferData.nbytes} bytes at vertex {offset} is outside the "
+                             f"{self.byteLength} bytes buffer")
+        self.bind()
+        gl.glBufferSubData(gl.GL_ARRAY_BUFFER, byteOffset, bufferData.nbytes, bufferData)
+
+    def setAttribPointer(self, attribLoc, stride=0, offset=0, attribSize=0, attribType=gl.GL_FLOAT, normalized=False):
+        """
+        stride and offset are counted in 4 bytes words.
+        For packed layouts give attribType (e.g. GL_HALF_FLOAT, GL_INT_2_10_10_10_REV, GL_UNSIGNED_BYTE) and
+        set normalized to map integer types to [0, 1] or [-1, 1]
+        """
         attribSize = self.vertexAttribSize if attribSize == 0 else attribSize
         if attribSize == 0:
             raise Exception("Cannot set vertex attrib with empty attribSize")
@@ -85,13 +327,119 @@ class VBO:
         self.bind()
         offset = ctypes.c_void_p(offset * 4)
         stride *= 4
-        gl.glVertexAttribPointer(attribLoc, attribSize, gl.GL_FLOAT, gl.GL_FALSE, stride, offset)
+        gl.glVertexAttribPointer(attribLoc, attribSize, attribType, gl.GL_TRUE if normalized else gl.GL_FALSE,
+                                 stride, offset)
         gl.glEnableVertexAttribArray(attribLoc)
 
     def draw(self):
         gl.glDrawArrays(gl.GL_TRIANGLES, 0, self.vertexNum)
 
 
+class StreamingVBO(VBO):
+    """
+    A VBO for vertices rewritten every frame, split into a ring of regions (three by default).
+    Each frame writes the next region through an unsynchronized glMapBufferRange, so it never waits on
+    the GPU still reading the regions of earlier frames. A fence placed after the draws reading a region
+    is only waited on when the ring comes back to it.
+
+    Use it like a VBO: setAttribPointer with offset 0, then every frame
+    baseVertex = write(vertices); draw, or ebo.draw(baseVertex) followed by fence()
+    """
+    regionBytes = 0
+    regionCount = 3
+    region = -1  # region written by the current frame
+    baseVertex = 0  # first vertex of the current region
+    fences = None  # sync object of every region, None once the GPU is done with it
+
+    fenceTimeout = 1000000000  # nanoseconds to wait for each glClientWaitSync attempt
+
+    def __init__(self, regionBytes, vertexAttribSize, regionCount=3):
+        """
+        :param regionBytes: bytes available to one frame, rounded up to whole vertices
+        :param vertexAttribSize: vertex size in 4 bytes words, as for setBuffer
+        :param regionCount: number of frames that can be in flight
+        """
+        super(StreamingVBO, self).__init__(gl.GL_STREAM_DRAW)
+        vertexBytes = 4 * vertexAttribSize
+        self.regionBytes = -(-regionBytes // vertexBytes) * vertexBytes
+        self.regionCount = regionCount
+        self.vertexAttribSize = vertexAttribSize
+        self.fences = [None] * regionCount
+        self.byteLength = self.regionBytes * regionCount
+
+        self.bind()
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, self.byteLength, None, self.usage)
+        GLResources.register("buffer", self.vbo, self.byteLength)
+
+    def setBuffer(self, bufferDataArray, vertexAttribSize=None):
+        """
+        Same as write, the ring keeps its size and vertex layout
+        """
+        self.write(bufferDataArray)
+
+    def write(self, array):
+        """
+        Copy this frame's vertices into the next region of the ring
+
+        :param array: vertices in the layout given at construction, as for VBO.update
+        :return: the first vertex of the region, to be used as base vertex (or first vertex) when drawing
+        """
+        if not isinstance(array, np.ndarray):
+            bufferData = np.frombuffer(array, dtype=np.uint8)
+        elif array.dtype.names is not None:
+            bufferData = np.ascontiguousarray(array)
+        else:
+            bufferData = np.ascontiguousarray(array, dtype=np.float32)
+        if bufferData.nbytes > self.regionBytes:
+            raise ValueError(f"{bufferData.nbytes} bytes do not fit in a {self.regionBytes} bytes region")
+
+        self.region = (self.region + 1) % self.regionCount
+        self.waitRegion(self.region)
+
+        byteOffset = self.region * self.regionBytes
+        self.bind()
+        pointer = gl.glMapBufferRange(gl.GL_ARRAY_BUFFER, byteOffset, self.regionBytes,
+                                      gl.GL_MAP_WRITE_BIT | gl.GL_MAP_INVALIDATE_RANGE_BIT |
+                                      gl.GL_MAP_UNSYNCHRONIZED_BIT)
+        ctypes.memmove(pointer, bufferData.ctypes.data, bufferData.nbytes)
+        gl.glUnmapBuffer(gl.GL_ARRAY_BUFFER)
+
+        self.vertexNum = bufferData.nbytes // (4 * self.vertexAttribSize)
+        self.baseVertex = byteOffset // (4 * self.vertexAttribSize)
+        return self.baseVertex
+
+    def waitRegion(self, region):
+        """
+        Block until the GPU has finished the draws fenced on region
+        """
+        fence = self.fences[region]
+        if fence is None:
+            return
+        while gl.glClientWaitSync(fence, gl.GL_SYNC_FLUSH_COMMANDS_BIT, self.fenceTimeout) == gl.GL_TIMEOUT_EXPIRED:
+            pass
+        gl.glDeleteSync(fence)
+        self.fences[region] = None
+
+    def fence(self):
+        """
+        Mark the current region as in use by the draws issued so far. Call after the last draw reading it.
+        """
+        if self.fences[self.region] is not None:
+            gl.glDeleteSync(self.fences[self.region])
+        self.fences[self.region] = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+
+    def delete(self):
+        for region, fence in enumerate(self.fences):
+            if fence is not None:
+                gl.glDeleteSync(fence)
+                self.fences[region] = None
+        super(StreamingVBO, self).delete()
+
+    def draw(self):
+        gl.glDrawArrays(gl.GL_TRIANGLES, self.baseVertex, self.vertexNum)
+        self.fence()
+
+
 class EBO:
     """
     A class to handle EBO in OpenGL, with some help functions
@@ -99,30 +447,140 @@ class EBO:
     ebo = None
     indexNum = 0
     triangleNum = 0
-
-    def __init__(self):
+    indexDtype = np.dtype("uint32")
+    indexType = gl.GL_UNSIGNED_INT
+    mode = gl.GL_TRIANGLES
+
+    # marks the end of a strip in index arrays given to setBuffer, replaced by the largest value of the index type
+    primitiveRestart = np.iinfo(np.uint32).max
+    restartIndex = None
+    byteLength = 0  # size of the GPU buffer allocated by the last setBuffer
+    usage = gl.GL_STATIC_DRAW
+
+    # smallest first: (numpy type, GL type). The largest value of each type is left free for primitive restart
+    indexTypes = [(np.dtype("uint8"), gl.GL_UNSIGNED_BYTE),
+                  (np.dtype("uint16"), gl.GL_UNSIGNED_SHORT),
+                  (np.dtype("uint32"), gl.GL_UNSIGNED_INT)]
+
+    def __init__(self, usage=gl.GL_STATIC_DRAW):
+        """
+        :param usage: gl.GL_STATIC_DRAW, gl.GL_DYNAMIC_DRAW or gl.GL_STREAM_DRAW, as for VBO
+        """
         self.ebo = gl.glGenBuffers(1)
+        self.usage = usage
+        GLResources.register("buffer", self.ebo)
 
-    # def __del__(self):
-    #     gl.glDeleteBuffers(1, self.ebo)
+    def delete(self):
+        """
+        Free the GPU buffer, the EBO must not be used afterwards
+        """
+        if self.ebo is not None:
+            gl.glDeleteBuffers(1, [self.ebo])
+            GLState.forgetBuffer(self.ebo)
+            GLResources.unregister("buffer", self.ebo)
+            self.ebo = None
 
     def bind(self):
-        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        GLState.bindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+
+    @classmethod
+    def chooseIndexType(cls, vertexNum):
+        """
+        :return: the smallest (numpy dtype, GL type) pair able to address vertexNum vertices
+        """
+        for dtype, glType in cls.indexTypes:
+            if vertexNum <= np.iinfo(dtype).max:
+                return dtype, glType
+        raise ValueError(f"Too many vertices to index: {vertexNum}")
 
-    def setBuffer(self, bufferDataArray: np.ndarray):
-        if bufferDataArray.dtype != np.dtype("int32"):
-            bufferDataArray = bufferDataArray.astype(np.dtype("int32"))
-        bufferData = bufferDataArray.flatten("C")  # row-major order flatten
+    def setBuffer(self, bufferDataArray: np.ndarray, vertexNum=None, mode=gl.GL_TRIANGLES):
+        """
+        :param bufferDataArray: the indices. It will be flatten in row-major order if its dimension isn't one
+        :type bufferDataArray: numpy.ndarray
+        :param vertexNum: number of vertices the indices refer to, decides the index type.
+                          If not given, it is derived from the largest index
+        :type vertexNum: int
+        :param mode: gl.GL_TRIANGLES, or gl.GL_TRIANGLE_STRIP with strips separated by EBO.primitiveRestart
+        """
+        restart = None
+        if mode == gl.GL_TRIANGLE_STRIP:
+            restart = bufferDataArray == self.primitiveRestart
+        if vertexNum is None:
+            used = bufferDataArray if restart is None else bufferDataArray[~restart]
+            vertexNum = int(used.max()) + 1 if used.size > 0 else 0
+        self.indexDtype, self.indexType = self.chooseIndexType(vertexNum)
+        self.mode = mode
+
+        # row-major order flatten, without a copy when the array already has the index type and is C-contiguous
+        bufferData = np.ascontiguousarray(bufferDataArray, dtype=self.indexDtype).reshape(-1)
 
         self.indexNum = bufferData.size
-        self.triangleNum = self.indexNum // 3  # floor division to get triangle number
-        byteLength = 4 * self.indexNum
+        if restart is None:
+            self.restartIndex = None
+            self.triangleNum = self.indexNum // 3  # floor division to get triangle number
+        else:
+            self.restartIndex = int(np.iinfo(self.indexDtype).max)
+            if self.restartIndex != self.primitiveRestart:
+                # a narrower type was converted into a new array, the caller's indices are untouched
+                bufferData[restart.reshape(-1)] = self.restartIndex
+            stripNum = int(np.count_nonzero(restart)) + 1
+            self.triangleNum = max(0, self.indexNum - (stripNum - 1) - 2 * stripNum)
+        self.byteLength = self.indexDtype.itemsize * self.indexNum
 
         self.bind()
-        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, byteLength, bufferData, gl.GL_STATIC_DRAW)
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, self.byteLength, bufferData, self.usage)
+        GLResources.register("buffer", self.ebo, self.byteLength)
 
-    def draw(self):
-        gl.glDrawElements(gl.GL_TRIANGLES, self.indexNum, gl.GL_UNSIGNED_INT, None)
+    def allocate(self, indexNum, vertexNum):
+        """
+        Allocate an uninitialized buffer for indexNum indices addressing up to vertexNum vertices,
+        to be filled through update
+        """
+        self.indexDtype, self.indexType = self.chooseIndexType(vertexNum)
+        self.indexNum = 0
+        self.triangleNum = 0
+        self.byteLength = self.indexDtype.itemsize * indexNum
+
+        self.bind()
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, self.byteLength, None, self.usage)
+        GLResources.register("buffer", self.ebo, self.byteLength)
+
+    def update(self, offset, array):
+        """
+        Overwrite part of the indices in place. The index type chosen by setBuffer is kept, so the new indices
+        must still fit in it.
+
+        :param offset: position of the first index to overwrite
+        :param array: numpy indices, converted to the index type unless they already have it (EBO.primitiveRestart
+                      wraps to the restart index of narrower types), or a buffer-protocol object already holding
+                      indices of that type, sent as raw bytes
+        """
+        if isinstance(array, np.ndarray):
+            bufferData = np.ascontiguousarray(array, dtype=self.indexDtype).reshape(-1)
+        else:
+            bufferData = np.frombuffer(array, dtype=np.uint8)
+
+        byteOffset = offset * self.indexDtype.itemsize
+        if byteOffset < 0 or byteOffset + bufferData.nbytes > self.byteLength:
+            raise ValueError(f"Update of {bufferData.nbytes} bytes at index {offset} is outside the "
+                             f"{self.byteLength} bytes buffer")
+        self.bind()
+        gl.glBufferSubData(gl.GL_ELEMENT_ARRAY_BUFFER, byteOffset, bufferData.nbytes, bufferData)
+
+    def draw(self, baseVertex=0):
+        """
+        :param baseVertex: added to every index, for vertices stored further into the VBO
+                           (e.g. the region returned by StreamingVBO.write)
+        """
+        if self.restartIndex is not None:
+            gl.glEnable(gl.GL_PRIMITIVE_RESTART)
+            gl.glPrimitiveRestartIndex(self.restartIndex)
+        if baseVertex:
+            gl.glDrawElementsBaseVertex(self.mode, self.indexNum, self.indexType, None, baseVertex)
+        else:
+            gl.glDrawElements(self.mode, self.indexNum, self.indexType, None)
+        if self.restartIndex is not None:
+            gl.glDisable(gl.GL_PRIMITIVE_RESTART)
 
 
 class VAO:
@@ -133,36 +591,280 @@ class VAO:
 
     def __init__(self):
         self.vao = gl.glGenVertexArrays(1)
+        GLResources.register("vertex array", self.vao)
 
-    # def __del__(self):
-    #     gl.glDeleteVertexArrays(1, self.vao)
+    def delete(self):
+        """
+        Free the vertex array object, the buffers it refers to are not deleted
+        """
+        if self.vao is not None:
+            if GLState.vertexArray == self.vao:
+                self.unbind()
+            gl.glDeleteVertexArrays(1, [self.vao])
+            GLState.forgetVertexArray(self.vao)
+            GLResources.unregister("vertex array", self.vao)
+            self.vao = None
 
     def bind(self):
-        gl.glBindVertexArray(self.vao)
+        GLState.bindVertexArray(self.vao)
 
     def unbind(self):
-        gl.glBindVertexArray(0)
+        GLState.bindVertexArray(0)
+
+
+class RangeAllocator:
+    """
+    First-fit free list over [0, capacity). Freed ranges are merged with free neighbours.
+    """
+    capacity = 0
+    freeRanges = None  # [start, count] of every free range, sorted by start
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.freeRanges = [[0, capacity]] if capacity > 0 else []
+
+    def allocate(self, count):
+        """
+        :return: start of a free range of count elements, or None if none is large enough
+        """
+        for i, (start, size) in enumerate(self.freeRanges):
+            if size >= count:
+                if size == count:
+                    del self.freeRanges[i]
+                else:
+                    self.freeRanges[i] = [start + count, size - count]
+                return start
+        return None
+
+    def free(self, start, count):
+        freeRanges = self.freeRanges
+        i = bisect.bisect_left(freeRanges, [start, 0])
+        freeRanges.insert(i, [start, count])
+        if i + 1 < len(freeRanges) and start + count == freeRanges[i + 1][0]:
+            freeRanges[i][1] += freeRanges.pop(i + 1)[1]
+        if i > 0 and freeRanges[i - 1][0] + freeRanges[i - 1][1] == start:
+            freeRanges[i - 1][1] += freeRanges.pop(i)[1]
+
+    def grow(self, capacity):
+        """
+        Extend the range to [0, capacity), the new tail is free
+        """
+        previous, self.capacity = self.capacity, capacity
+        self.free(previous, capacity - previous)
+
+
+class ArenaAllocation:
+    """
+    Where one mesh lives in a MeshArena
+    """
+    vertexStart = 0
+    vertexNum = 0
+    indexStart = 0
+    indexNum = 0
+    mode = gl.GL_TRIANGLES
+
+    def __init__(self, vertexStart, vertexNum, indexStart, indexNum, mode):
+        self.vertexStart = vertexStart
+        self.vertexNum = vertexNum
+        self.indexStart = indexStart
+        self.indexNum = indexNum
+        self.mode = mode
+
+
+class MeshArena:
+    """
+    One VBO and one EBO shared by many static meshes of the same vertex layout, set up in a single VAO.
+    Each mesh takes a range of both buffers from a free list, its indices stay local to its vertices and are
+    drawn with glDrawElementsBaseVertex, so consecutive meshes need no buffer or VAO bind in between.
+    Indices are 16 bits, meshes must have fewer than 65535 vertices (the largest value restarts strips).
+    Buffers double when full, the data is copied on the GPU.
+    """
+    vao = None
+    vbo = None
+    ebo = None
+
+    vertexAttribSize = 0
+    attribPointers = None  # (attribute location, offset, size) of every attribute, in 4 bytes words
+    vertexRanges = None  # RangeAllocator counting vertices
+    indexRanges = None  # RangeAllocator counting indices
+    maxVertexNum = 0xFFFF  # exclusive, the value itself is the restart index
+
+    def __init__(self, vertexAttribSize, attribPointers, vertexCapacity=1 << 16, indexCapacity=1 << 18):
+        """
+        :param vertexAttribSize: vertex size in 4 bytes words
+        :param attribPointers: (attribute location, offset, size) of every float attribute
+        """
+        self.vertexAttribSize = vertexAttribSize
+        self.attribPointers = [p for p in attribPointers if p[0] >= 0]
+        self.vertexRanges = RangeAllocator(vertexCapacity)
+        self.indexRanges = RangeAllocator(indexCapacity)
+
+        self.vao = VAO()
+        self.vbo = VBO()
+        self.ebo = EBO()
+        self.vao.bind()
+        self.vbo.allocate(vertexCapacity * 4 * vertexAttribSize, vertexAttribSize)
+        self.ebo.allocate(indexCapacity, self.maxVertexNum)
+        self.setAttribPointers()
+
+    def setAttribPointers(self):
+        for attribLoc, offset, size in self.attribPointers:
+            self.vbo.setAttribPointer(attribLoc, stride=self.vertexAttribSize, offset=offset, attribSize=size)
+
+    def fits(self, vertices, indices):
+        return 0 < len(vertices) < self.maxVertexNum and np.size(indices) > 0
+
+    def allocate(self, vertices, indices, mode=gl.GL_TRIANGLES):
+        """
+        Copy a mesh into the arena
 
+        :param indices: triangles, or strips split by EBO.primitiveRestart, local to vertices
+        :rtype: ArenaAllocation
+        """
+        vertexNum, indexNum = len(vertices), np.size(indices)
+        vertexStart = self.vertexRanges.allocate(vertexNum)
+        if vertexStart is None:
+            self.growVertices(vertexNum)
+            vertexStart = self.vertexRanges.allocate(vertexNum)
+        indexStart = self.indexRanges.allocate(indexNum)
+        if indexStart is None:
+            self.growIndices(indexNum)
+            indexStart = self.indexRanges.allocate(indexNum)
+
+        self.vao.bind()  # the element buffer binding belongs to the bound VAO
+        self.vbo.update(vertexStart, vertices)
+        self.ebo.update(indexStart, indices)
+        return ArenaAllocation(vertexStart, vertexNum, indexStart, indexNum, mode)
+
+    def free(self, allocation):
+        self.vertexRanges.free(allocation.vertexStart, allocation.vertexNum)
+        self.indexRanges.free(allocation.indexStart, allocation.indexNum)
+
+    @staticmethod
+    def copyBuffer(source, target, byteLength):
+        GLState.bindBuffer(gl.GL_COPY_READ_BUFFER, source)
+        GLState.bindBuffer(gl.GL_COPY_WRITE_BUFFER, target)
+        gl.glCopyBufferSubData(gl.GL_COPY_READ_BUFFER, gl.GL_COPY_WRITE_BUFFER, 0, 0, byteLength)
+
+    def growVertices(self, vertexNum):
+        capacity = max(2 * self.vertexRanges.capacity, self.vertexRanges.capacity + vertexNum)
+        vbo = VBO()
+        vbo.allocate(capacity * 4 * self.vertexAttribSize, self.vertexAttribSize)
+        self.copyBuffer(self.vbo.vbo, vbo.vbo, self.vbo.byteLength)
+        self.vbo.delete()
+        self.vbo = vbo
+        self.vertexRanges.grow(capacity)
+        self.vao.bind()
+        self.setAttribPointers()
+
+    def growIndices(self, indexNum):
+        capacity = max(2 * self.indexRanges.capacity, self.indexRanges.capacity + indexNum)
+        self.vao.bind()  # allocate binds the new element buffer into the VAO
+        ebo = EBO()
+        ebo.allocate(capacity, self.maxVertexNum)
+        self.copyBuffer(self.ebo.ebo, ebo.ebo, self.ebo.byteLength)
+        self.ebo.delete()
+        self.ebo = ebo
+        self.indexRanges.grow(capacity)
+
+    def draw(self, allocation):
+        self.vao.bind()
+        offset = ctypes.c_void_p(allocation.indexStart * self.ebo.indexDtype.itemsize)
+        if allocation.mode == gl.GL_TRIANGLE_STRIP:
+            gl.glEnable(gl.GL_PRIMITIVE_RESTART)
+            gl.glPrimitiveRestartIndex(self.maxVertexNum)
+        gl.glDrawElementsBaseVertex(allocation.mode, allocation.indexNum, self.ebo.indexType, offset,
+                                    allocation.vertexStart)
+        if allocation.mode == gl.GL_TRIANGLE_STRIP:
+            gl.glDisable(gl.GL_PRIMITIVE_RESTART)
+
+    def delete(self):
+        self.vao.delete()
+        self.vbo.delete()
+        self.ebo.delete()
+
+
+class TextureUnits:
+    """
+    Texture image units and the texture resident in each.
+    Units 1 to arrayUnit - 1 hold 2D textures: a texture keeps its unit while it is used, the least recently used unit
+    goes to the next texture that isn't resident. Unit 0 never holds a texture, untextured draws point samplers at it.
+    The last unit is reserved to texture arrays, so a 2D and an array sampler never point at the same unit.
+    Sampler uniforms are set through the GLProgram setters, whose shadow copy skips writing an unchanged unit.
+    """
+    unitCount = 16  # the least every OpenGL 3.3 implementation offers to the fragment shader
+    arrayUnit = unitCount - 1
+
+    residents = collections.OrderedDict()  # unit -> texture name, least recently used first
+    unitOf = {}  # texture name -> unit
+    arrayResident = 0  # texture array bound in arrayUnit
+
+    @classmethod
+    def bind(cls, textureName):
+        """
+        Make a texture resident, binding it only if it isn't already
+
+        :return: the unit holding it
+        """
+        unit = cls.unitOf.get(textureName)
+        if unit is not None:
+            cls.residents.move_to_end(unit)
+            return unit
+
+        # the lowest free unit, forget may have freed one anywhere in the range
+        unit = next((unit for unit in range(1, cls.arrayUnit) if unit not in cls.residents), None)
+        if unit is None:
+            unit, evicted = cls.residents.popitem(last=False)
+            del cls.unitOf[evicted]
+        cls.activate(unit)
+        GLState.bindTexture(gl.GL_TEXTURE_2D, textureName)
+        cls.residents[unit] = textureName
+        cls.unitOf[textureName] = unit
+        return unit
+
+    @classmethod
+    def bindArray(cls, textureName):
+        """
+        Bind a texture array in arrayUnit, only if it isn't already
+        """
+        if cls.arrayResident != textureName:
+            cls.activate(cls.arrayUnit)
+            GLState.bindTexture(gl.GL_TEXTURE_2D_ARRAY, textureName)
+            cls.arrayResident = textureName
+
+    @classmethod
+    def activate(cls, unit):
+        GLState.activeTexture(unit)
+
+    @classmethod
+    def forget(cls, textureName):
+        """
+        Stop tracking a deleted texture, its unit becomes free
+        """
+        unit = cls.unitOf.pop(textureName, None)
+        if unit is not None:
+            del cls.residents[unit]
+        if cls.arrayResident == textureName:
+            cls.arrayResident = 0
+        GLState.forgetTexture(textureName)
 
-# A global variable in this scope to store next texture id, there should be no duplicate textureUnitID
-NextTextureID = 1
 
 class Texture:
     """
     Packed help functions to deal with texture mapping in OpenGL, can be used to store multiple textures
     """
     textureName = 0
-    textureUnitID = 0
+    textureUnitID = 0  # unit given by TextureUnits at the last bind
+    key = None  # TextureCache key when the texture is shared through it
+    byteLength = 0  # GPU memory of the uploaded levels
 
     def __init__(self):
-        global NextTextureID
-
-        # assign a texture image unit for this sampler
-        self.textureUnitID = NextTextureID
-        NextTextureID = NextTextureID % 16 + 1
+        pass
 
     def setTextureImage(self, image):
-        self.textureName = gl.glGenTextures(1)
+        # a new image replaces the storage of the same texture name
+        if not self.textureName:
+            self.textureName = gl.glGenTextures(1)
 
         # flip image upside down.
         # trim to RGB channels, even if a channel provided
@@ -172,25 +874,139 @@ class Texture:
         height, width, channel = image.shape
         imageData = image.flatten("C")
 
-        gl.glBindTexture(gl.GL_TEXTURE_2D, self.textureName)
+        # upload in the texture's own unit, so the texture resident in the active unit is left alone
+        self.textureUnitID = TextureUnits.bind(self.textureName)
+        TextureUnits.activate(self.textureUnitID)
         gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGB, width, height, 0, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, imageData)
         gl.glGenerateMipmap(gl.GL_TEXTURE_2D)
         self.setTextureParameters()
+        self.byteLength = width * height * channel * 4 // 3  # with mipmaps
+        GLResources.register("texture", self.textureName, self.byteLength)
+
+    def setMipChain(self, levels):
+        """
+        Upload a precomputed mip chain as is, see MipChain
+
+        :param levels: uint8 arrays of shape (height, width, 3), largest first, already flipped bottom row first
+        """
+        if not self.textureName:
+            self.textureName = gl.glGenTextures(1)
+        self.textureUnitID = TextureUnits.bind(self.textureName)
+        TextureUnits.activate(self.textureUnitID)
+
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)  # rows of small levels aren't multiples of 4 bytes
+        for levelIndex, level in enumerate(levels):
+            height, width, _ = level.shape
+            gl.glTexImage2D(gl.GL_TEXTURE_2D, levelIndex, gl.GL_RGB, width, height, 0, gl.GL_RGB,
+                            gl.GL_UNSIGNED_BYTE, np.ascontiguousarray(level))
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 4)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
+        self.setTextureParameters()
+        self.byteLength = sum(level.nbytes for level in levels)
+        GLResources.register("texture", self.textureName, self.byteLength)
+
+    def delete(self):
+        """
+        Free the texture, the object can be given a new image afterwards
+        """
+        if self.textureName:
+            TextureUnits.forget(self.textureName)
+            gl.glDeleteTextures(1, [self.textureName])
+            GLResources.unregister("texture", self.textureName)
+            self.textureName = 0
+            self.byteLength = 0
 
     def setTextureParameters(self):
         # for 2D texture, need wrap along s and t
         gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_REPEAT)
         gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_REPEAT)
-        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR_MIPMAP_LINEAR)
         gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
 
-    def bind(self, glslVariableLoc):
-        gl.glActiveTexture(gl.GL_TEXTURE0 + self.textureUnitID)
-        gl.glBindTexture(gl.GL_TEXTURE_2D, self.textureName)
-        gl.glUniform1i(glslVariableLoc, self.textureUnitID)
+    def bindProgram(self, shaderProg):
+        """
+        Texture the next draws of shaderProg. No GL call at all when the texture is still resident
+        and the sampler already points at it
+        """
+        shaderProg.setBool("textureArrayOn", False)
+        if not self.textureName:
+            shaderProg.setInt("textureImage", 0)  # no image yet
+            return
+        self.textureUnitID = TextureUnits.bind(self.textureName)
+        shaderProg.setInt("textureImage", self.textureUnitID)
+
+    def unbindProgram(self, shaderProg):
+        shaderProg.setBool("textureArrayOn", False)
+        shaderProg.setInt("textureImage", 0)
+
+
+class TextureArray:
+    """
+    A GL_TEXTURE_2D_ARRAY: layers of one size, each with its own mip chain, sampled with a layer index.
+    Objects textured from the same array draw without any texture bind in between.
+    It is always bound in TextureUnits.arrayUnit. The storage can't grow, see TextureArrays for reallocation.
+    """
+    textureName = 0
+    width = 0
+    height = 0
+    layerCount = 0
+    levelCount = 0
+    byteLength = 0  # GPU memory of every level of every layer
+
+    def __init__(self, width, height, layerCount, levelCount=None):
+        """
+        Allocate every level of every layer, left undefined until setLayer
+
+        :param levelCount: number of mip levels, the full chain down to 1 x 1 if not given
+        """
+        sizes = [(width, height)]
+        while sizes[-1] != (1, 1):
+            sizes.append((max(1, sizes[-1][0] // 2), max(1, sizes[-1][1] // 2)))
+        self.levelCount = len(sizes) if levelCount is None else min(levelCount, len(sizes))
+        self.width, self.height, self.layerCount = width, height, layerCount
+
+        self.textureName = gl.glGenTextures(1)
+        self.bind()
+        # OpenGL 3.3 has no immutable storage, every level is specified with no data
+        for level, (levelWidth, levelHeight) in enumerate(sizes[:self.levelCount]):
+            gl.glTexImage3D(gl.GL_TEXTURE_2D_ARRAY, level, gl.GL_RGB8, levelWidth, levelHeight, layerCount, 0,
+                            gl.GL_RGB, gl.GL_UNSIGNED_BYTE, None)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_MAX_LEVEL, self.levelCount - 1)
+        # images share layers in an atlas, the shader clamps coordinates to the image instead of wrapping
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR_MIPMAP_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+        self.byteLength = sum(w * h * 3 for w, h in sizes[:self.levelCount]) * layerCount
+        GLResources.register("texture", self.textureName, self.byteLength)
+
+    def setLayer(self, layer, levels, x=0, y=0):
+        """
+        Upload a mip chain into a layer, at texel (x, y) of level 0. Level l goes to (x >> l, y >> l),
+        so x and y must be multiples of 2 ** (levelCount - 1) for every level to line up.
+
+        :param levels: uint8 arrays of shape (height, width, 3), largest first, see MipChain
+        :return: bytes uploaded
+        """
+        self.bind()
+        uploaded = 0
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        for levelIndex, level in enumerate(levels[:self.levelCount]):
+            height, width, _ = level.shape
+            gl.glTexSubImage3D(gl.GL_TEXTURE_2D_ARRAY, levelIndex, x >> levelIndex, y >> levelIndex, layer,
+                               width, height, 1, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, np.ascontiguousarray(level))
+            uploaded += level.nbytes
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 4)
+        return uploaded
 
-    def unbind(self, glslVariableLoc):
-        gl.glActiveTexture(gl.GL_TEXTURE0)
-        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
-        gl.glUniform1i(glslVariableLoc, 0)
+    def bind(self):
+        TextureUnits.bindArray(self.textureName)
+
+    def delete(self):
+        if self.textureName:
+            TextureUnits.forget(self.textureName)
+            gl.glDeleteTextures(1, [self.textureName])
+            GLResources.unregister("texture", self.textureName)
+            self.textureName = 0
+            self.byteLength = 0
 
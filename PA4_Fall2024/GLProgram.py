@@ -5,6 +5,7 @@ Set up the pyopengl rendering program, including vertex shader and fragment shad
 :version: 2024.11.11
 '''
 
+from GLBuffer import GLState
 from Light import Light
 
 try:
@@ -61,10 +62,17 @@ class GLProgram:
     ready = False  # a control flag which reflect if this GLprogram is ready
     debug = 0
 
+    uniformLocations = None  # uniform name in the program -> location, filled at compile
+    uniformValues = None  # location -> bytes of the value last uploaded there, equal values aren't uploaded again
+    uniformUploads = 0
+    uniformSkips = 0
+
     def __init__(self) -> None:
         self.program = gl.glCreateProgram()
 
         self.ready = False
+        self.uniformLocations = {}
+        self.uniformValues = {}
 
         # define attribs name and corresponding method to set it
         self.attribs = {
@@ -74,6 +82,10 @@ class GLProgram:
             "vertexTexture": "aTexture",
 
             "textureImage": "theTexture01",
+            "textureArray": "theTextureArray",
+            "textureArrayOn": "textureArrayOn",
+            "textureLayer": "textureLayer",
+            "textureRect": "textureRect",
 
             "projectionMat": "projection",
             "viewMat": "view",
@@ -116,6 +128,7 @@ class GLProgram:
     def __del__(self) -> None:
         try:
             gl.glDeleteProgram(self.program)
+            GLState.forgetProgram(self.program)
         except Exception as e:
             pass
 
@@ -201,6 +214,11 @@ class GLProgram:
         
         uniform int renderingFlag;
         uniform sampler2D {self.attribs["textureImage"]};
+        // textures packed in a texture array: image in layer textureLayer, at textureRect (offset xy, size zw)
+        uniform sampler2DArray {self.attribs["textureArray"]};
+        uniform bool {self.attribs["textureArrayOn"]};
+        uniform float {self.attribs["textureLayer"]};
+        uniform vec4 {self.attribs["textureRect"]};
         
         uniform vec3 {self.attribs["viewPosition"]};
         uniform Material {self.attribs["material"]};
@@ -375,7 +393,13 @@ class GLProgram:
             // Reserved for texture mapping, get point color from texture image and texture coordinates
             // Routing name is "texture"
             if ((renderingFlag >> 8 & 0x1) == 1){{
-                results[ri] = texture({self.attribs["textureImage"]}, vTexture);
+                if ({self.attribs["textureArrayOn"]}){{
+                    vec2 uv = {self.attribs["textureRect"]}.xy + clamp(vTexture, 0.0, 1.0) * {self.attribs["textureRect"]}.zw;
+                    results[ri] = texture({self.attribs["textureArray"]}, vec3(uv, {self.attribs["textureLayer"]}));
+                }}
+                else{{
+                    results[ri] = texture({self.attribs["textureImage"]}, vTexture);
+                }}
                 ri+=1;
             }}
             
@@ -500,15 +524,45 @@ class GLProgram:
         return attribLoc
 
     def getUniformLocation(self, name, lookThroughAttribs=True):
+        """
+        Location of a uniform, from the table built at compile. The driver is only asked for names not in the table.
+
+        :param name: key of attribs, or uniform name in the program if not lookThroughAttribs.
+                     A location (int) is returned as is, so every setter also accepts one.
+        """
+        if isinstance(name, (int, np.integer)):
+            return name
         if lookThroughAttribs:
             variableName = self.getAttribName(name)
         else:
             variableName = name
-        uniformLoc = gl.glGetUniformLocation(self.program, variableName)
-        if uniformLoc == -1 and self.debug > 1:
-            print(f"Warning: Uniform {name} cannot found. Might have been optimized off")
+        uniformLoc = self.uniformLocations.get(variableName)
+        if uniformLoc is None:
+            uniformLoc = gl.glGetUniformLocation(self.program, variableName)
+            self.uniformLocations[variableName] = uniformLoc
+            if uniformLoc == -1 and self.debug > 1:
+                print(f"Warning: Uniform {name} cannot found. Might have been optimized off")
         return uniformLoc
 
+    def cacheUniformLocations(self):
+        """
+        Enumerate the active uniforms of the linked program once and record their locations.
+        Members of struct arrays are listed one by one ("light[3].position"), arrays of basic types only by
+        their first element ("name[0]"), their other elements are recorded here too.
+        """
+        self.uniformLocations = {}
+        self.uniformValues = {}  # linking resets every uniform
+        for index in range(gl.glGetProgramiv(self.program, gl.GL_ACTIVE_UNIFORMS)):
+            name, size, _ = gl.glGetActiveUniform(self.program, index)
+            if isinstance(name, bytes):
+                name = name.decode().rstrip("\0")
+            self.uniformLocations[name] = gl.glGetUniformLocation(self.program, name)
+            if name.endswith("[0]"):
+                self.uniformLocations[name[:-3]] = self.uniformLocations[name]
+                for i in range(1, size):
+                    element = f"{name[:-3]}[{i}]"
+                    self.uniformLocations[element] = gl.glGetUniformLocation(self.program, element)
+
     def getAttribName(self, attribIndexName):
         return self.attribs[attribIndexName]
 
@@ -540,6 +594,7 @@ class GLProgram:
             info = gl.glGetShaderInfoLog(self.program)
             raise Exception(info)
 
+        self.cacheUniformLocations()
         self.ready = True
 
     def setFragmentShaderRouting(self, routing="lighting"):
@@ -585,7 +640,7 @@ class GLProgram:
         """
         if not self.ready:
             raise Exception("GLProgram must compile before use it")
-        gl.glUseProgram(self.program)
+        GLState.useProgram(self.program)
 
     def setLight(self, lightIndex: int, light: Light):
         if not isinstance(light, Light):
@@ -609,54 +664,103 @@ class GLProgram:
             self.setLight(i, light)
 
     # some help methods to set uniform in program
+    # values are converted to the uniform's type first, then uploaded only if their bytes differ from the shadow copy
+    def uniformChanged(self, location, data):
+        """
+        Compare data with the last value uploaded to location, remembering it if it differs
+
+        :param data: numpy value of the uniform's type
+        """
+        value = data.tobytes()
+        if self.uniformValues.get(location) == value:
+            self.uniformSkips += 1
+            return False
+        self.uniformValues[location] = value
+        self.uniformUploads += 1
+        return True
+
+    def uniformCounts(self, reset=False):
+        """
+        :param reset: start counting again from 0, e.g. once per frame
+        :return: (uniform values uploaded, uniform values skipped as equal to the last upload)
+        """
+        result = (self.uniformUploads, self.uniformSkips)
+        if reset:
+            self.uniformUploads = self.uniformSkips = 0
+        return result
+
     def setMat4(self, name, mat, lookThroughAttribs=True):
         self.use()
         if mat.shape != (4, 4):
             raise Exception("Projection Matrix must have 4x4 shape")
-        gl.glUniformMatrix4fv(self.getUniformLocation(name, lookThroughAttribs), 1, gl.GL_FALSE, mat.flatten("C"))
+        data = np.ascontiguousarray(mat, dtype=np.float32)
+        location = self.getUniformLocation(name, lookThroughAttribs)
+        if self.uniformChanged(location, data):
+            gl.glUniformMatrix4fv(location, 1, gl.GL_FALSE, data)
 
     def setMat3(self, name, mat, lookThroughAttribs=True):
         self.use()
         if mat.shape != (3, 3):
             raise Exception("Projection Matrix must have 3x3 shape")
-        gl.glUniformMatrix3fv(self.getUniformLocation(name, lookThroughAttribs), 1, gl.GL_FALSE, mat.flatten("C"))
+        data = np.ascontiguousarray(mat, dtype=np.float32)
+        location = self.getUniformLocation(name, lookThroughAttribs)
+        if self.uniformChanged(location, data):
+            gl.glUniformMatrix3fv(location, 1, gl.GL_FALSE, data)
 
     def setMat2(self, name, mat, lookThroughAttribs=True):
         self.use()
         if mat.shape != (2, 2):
             raise Exception("Projection Matrix must have 2x2 shape")
-        gl.glUniformMatrix2fv(self.getUniformLocation(name, lookThroughAttribs), 1, gl.GL_FALSE, mat.flatten("C"))
+        data = np.ascontiguousarray(mat, dtype=np.float32)
+        location = self.getUniformLocation(name, lookThroughAttribs)
+        if self.uniformChanged(location, data):
+            gl.glUniformMatrix2fv(location, 1, gl.GL_FALSE, data)
 
     def setVec4(self, name, vec, lookThroughAttribs=True):
         self.use()
-        if vec.size != 4:
+        data = np.ascontiguousarray(vec, dtype=np.float32)
+        if data.size != 4:
             raise Exception("Vector must have size 4")
-        gl.glUniform4fv(self.getUniformLocation(name, lookThroughAttribs), 1, vec)
+        location = self.getUniformLocation(name, lookThroughAttribs)
+        if self.uniformChanged(location, data):
+            gl.glUniform4fv(location, 1, data)
 
     def setVec3(self, name, vec, lookThroughAttribs=True):
         self.use()
-        if vec.size != 3:
+        data = np.ascontiguousarray(vec, dtype=np.float32)
+        if data.size != 3:
             raise Exception("Vector must have size 3")
-        gl.glUniform3fv(self.getUniformLocation(name, lookThroughAttribs), 1, vec)
+        location = self.getUniformLocation(name, lookThroughAttribs)
+        if self.uniformChanged(location, data):
+            gl.glUniform3fv(location, 1, data)
 
     def setVec2(self, name, vec, lookThroughAttribs=True):
         self.use()
-        if vec.size != 2:
+        data = np.ascontiguousarray(vec, dtype=np.float32)
+        if data.size != 2:
             raise Exception("Vector must have size 2")
-        gl.glUniform2fv(self.getUniformLocation(name, lookThroughAttribs), 1, vec)
+        location = self.getUniformLocation(name, lookThroughAttribs)
+        if self.uniformChanged(location, data):
+            gl.glUniform2fv(location, 1, data)
 
     def setBool(self, name, value, lookThroughAttribs=True):
         self.use()
         if value not in (0, 1):
             raise Exception("bool only accept True/False/0/1")
-        gl.glUniform1i(self.getUniformLocation(name, lookThroughAttribs), int(value))
+        location = self.getUniformLocation(name, lookThroughAttribs)
+        if self.uniformChanged(location, np.int32(value)):
+            gl.glUniform1i(location, int(value))
 
     def setInt(self, name, value, lookThroughAttribs=True):
         self.use()
         if value != int(value):
             raise Exception("set int only accept  integer")
-        gl.glUniform1i(self.getUniformLocation(name, lookThroughAttribs), int(value))
+        location = self.getUniformLocation(name, lookThroughAttribs)
+        if self.uniformChanged(location, np.int32(value)):
+            gl.glUniform1i(location, int(value))
 
     def setFloat(self, name, value, lookThroughAttribs=True):
         self.use()
-        gl.glUniform1f(self.getUniformLocation(name, lookThroughAttribs), float(value))
+        location = self.getUniformLocation(name, lookThroughAttribs)
+        if self.uniformChanged(location, np.float32(value)):
+            gl.glUniform1f(location, float(value))
@@ -0,0 +1,411 @@
+"""
+Define a process-wide mesh registry here.
+Displayables with the same class and geometry parameters share one generated mesh and one set of GPU buffers,
+their color is applied per draw through GLState.vertexAttrib3f.
+Optionally, generated arrays are also kept on disk as .npy files and memory-mapped on later launches,
+by default in the user's cache directory and within diskCacheMaxBytes.
+First version in 10/18/2026
+
+:version: 2026.1.1
+"""
+
+import hashlib
+import inspect
+import os
+
+import threading
+
+import numpy as np
+
+import GLBuffer
+import MeshOptimizer
+import VertexFormat
+from AssetLoader import AssetLoader
+from GLBuffer import VAO, VBO, EBO, GLState, MeshArena
+
+try:
+    import OpenGL
+
+    try:
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+    except ImportError:
+        from ctypes import util
+
+        orig_util_find_library = util.find_library
+
+
+        def new_util_find_library(name):
+            res = orig_util_find_library(name)
+            if res:
+                return res
+            return '/System/Library/Frameworks/' + name + '.framework/' + name
+
+
+        util.find_library = new_util_find_library
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+except ImportError:
+    raise ImportError("Required dependency PyOpenGL not present")
+
+
+class Mesh:
+    """
+    Generated vertices and indices together with the VAO/VBO/EBO they are uploaded to.
+    A Mesh is shared by every Displayable holding it, so it is uploaded only once.
+    Meshes are geometry only: the color attribute isn't read from the buffers, each draw sets the Displayable's
+    color as its constant value, so objects differing only in color share one mesh.
+
+    Set Mesh.compactVertices = True before initialization to upload the compact layout of VertexFormat
+    instead of eleven float32 per vertex.
+    """
+    compactVertices = False
+
+    key = None
+    # own GL objects, only created by initialize for a mesh that isn't stored in the arena
+    vao = None
+    vbo = None
+    ebo = None
+
+    vertices = None  # float32 array, every row is position(3) + normal(3) + color(3) + texture coordinate(2)
+    indices = None  # triangles of shape (n, 3), or a one dimensional array of strips split by EBO.primitiveRestart
+    primitiveMode = gl.GL_TRIANGLES
+    boundingRadius = 0  # radius of the bounding sphere around the model space origin
+
+    refCount = 0
+    initialized = False
+
+    colorLoc = -1  # color attribute, set per draw
+
+    arena = None  # MeshArena holding this mesh instead of its own buffers, see MeshCache.useArena
+    allocation = None
+
+    pendingShaderProg = None  # program given to initialize while the arrays were still being generated
+
+    def __init__(self, key, vertices=None, indices=None):
+        """
+        Arrays can be left out and given later to setArrays, e.g. when generated in the background
+        """
+        self.key = key
+        self.refCount = 0
+        self.initialized = False
+        if vertices is not None:
+            self.setArrays(vertices, indices)
+
+    def setArrays(self, vertices, indices):
+        self.vertices = vertices
+        self.indices = indices
+        self.primitiveMode = gl.GL_TRIANGLE_STRIP if np.ndim(indices) == 1 else gl.GL_TRIANGLES
+        self.boundingRadius = float(np.sqrt(np.max(np.sum(np.square(vertices[:, 0:3]), axis=1))))
+
+    def initialize(self, shaderProg):
+        """
+        Upload buffers and set attribute pointers. Only the first call does the work,
+        later Displayables sharing this mesh reuse the uploaded buffers.
+        A mesh still being generated is uploaded as soon as its arrays arrive.
+        """
+        if self.initialized:
+            return
+        if self.vertices is None:
+            self.pendingShaderProg = shaderProg
+            return
+        self.colorLoc = shaderProg.getAttribLocation("vertexColor")
+        arena = MeshCache.getArena(self, shaderProg)
+        if arena is not None:
+            self.arena = arena
+            self.allocation = arena.allocate(self.vertices, self.indices, self.primitiveMode)
+            self.initialized = True
+            return
+        if self.vao is None:
+            self.vao = VAO()
+            self.vbo = VBO()  # vbo can only be initiate with glProgram activated
+            self.ebo = EBO()
+        if self.compactVertices:
+            self.initializeCompact(shaderProg)
+            self.initialized = True
+            return
+
+        self.vao.bind()
+        self.vbo.setBuffer(self.vertices, 11)
+        self.ebo.setBuffer(self.indices, len(self.vertices), self.primitiveMode)
+
+        self.vbo.setAttribPointer(shaderProg.getAttribLocation("vertexPos"),
+                                  stride=11, offset=0, attribSize=3)
+        self.vbo.setAttribPointer(shaderProg.getAttribLocation("vertexNormal"),
+                                  stride=11, offset=3, attribSize=3)
+        self.vbo.setAttribPointer(shaderProg.getAttribLocation("vertexTexture"),
+                                  stride=11, offset=9, attribSize=2)
+        self.vao.unbind()
+        self.initialized = True
+
+    def initializeCompact(self, shaderProg):
+        packed, _ = VertexFormat.packCompact(self.vertices)
+        stride = packed.dtype.itemsize // 4
+
+        self.vao.bind()
+        self.vbo.setBuffer(packed, stride)
+        self.ebo.setBuffer(self.indices, len(self.vertices), self.primitiveMode)
+
+        self.vbo.setAttribPointer(shaderProg.getAttribLocation("vertexPos"),
+                                  stride=stride, offset=0, attribSize=3)
+        self.vbo.setAttribPointer(shaderProg.getAttribLocation("vertexNormal"),
+                                  stride=stride, offset=3, attribSize=4,
+                                  attribType=gl.GL_INT_2_10_10_10_REV, normalized=True)
+        self.vbo.setAttribPointer(shaderProg.getAttribLocation("vertexTexture"),
+                                  stride=stride, offset=4, attribSize=2, attribType=gl.GL_HALF_FLOAT)
+        self.vao.unbind()
+
+    def draw(self, color=None):
+        """
+        :param color: color of every vertex, the color attribute array is never enabled so it reads this value
+        """
+        if not self.initialized:
+            return  # still being generated
+        if color is not None and self.colorLoc >= 0:
+            GLState.vertexAttrib3f(self.colorLoc, color)
+        if self.allocation is not None:
+            self.arena.draw(self.allocation)
+            return
+        self.vao.bind()
+        self.ebo.draw()
+        # left bound, the next draw binds its own VAO and GLState skips binding this one again
+
+    def delete(self):
+        """
+        Free the GPU side of the mesh: its own buffers, or its range of the arena
+        """
+        if self.allocation is not None:
+            self.arena.free(self.allocation)
+            self.allocation = None
+        if self.vao is not None:
+            for glObject in (self.vao, self.vbo, self.ebo):
+                glObject.delete()
+            self.vao, self.vbo, self.ebo = None, None, None
+        self.initialized = False
+
+
+class MeshCache:
+    """
+    Registry of shared meshes, keyed by (Displayable class, geometry parameters)
+    """
+    meshes = {}  # key -> Mesh, shared by the whole process
+
+    diskCacheDir = None  # directory of the persistent .npy cache, None disables it
+    diskCacheMaxBytes = 256 * 1024 * 1024  # least recently used entries are deleted past this
+    codeVersions = {}  # Displayable class -> digest of the source files its meshes are generated from
+
+    # reorder triangles for the post-transform vertex cache at generation time. Parametric surfaces are already
+    # generated in cache sized bands, the optimizer only runs on meshes whose generated order scores poorly
+    optimizeVertexCache = True
+    optimizeMinACMR = 0.7  # meshes whose generated order scores below this are kept as is
+    acmrReport = {}  # key -> (ACMR as generated, ACMR stored) for every generated mesh, strips included
+
+    # set useArena = True before initialization to pack every mesh into one shared MeshArena
+    useArena = False
+    arena = None
+
+    debug = 0
+
+    @classmethod
+    def setDiskCache(cls, directory):
+        """
+        Enable the persistent cache in directory, or disable it with None
+        """
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        cls.diskCacheDir = directory
+
+    @staticmethod
+    def userCacheDir():
+        """
+        Directory for the persistent cache in the user's cache directory, outside the source tree
+        """
+        base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or \
+            os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(base, "PA4_Fall2024", "meshcache")
+
+    @classmethod
+    def acquire(cls, key, generateFunc):
+        """
+        Get the mesh for key and take a reference to it. The mesh is only generated on the first request.
+        Once AssetLoader is started, generation runs in the background: the mesh is returned without arrays
+        and draws nothing until AssetLoader.drain has uploaded it.
+
+        :param key: hashable description of the mesh, normally (Displayable class, geometry parameters).
+                    Color isn't part of it, Mesh.draw sets it per draw
+        :param generateFunc: called without arguments on a cache miss, returns (vertices, indices).
+                             Indices of shape (n, 3) are a triangle list, one dimensional indices are triangle strips
+        :rtype: Mesh
+        """
+        mesh = cls.meshes.get(key)
+        if mesh is None:
+            mesh = Mesh(key)
+            cls.meshes[key] = mesh
+            AssetLoader.submit(lambda: cls.loadOrGenerate(key, generateFunc),
+                               lambda arrays: cls.meshLoaded(mesh, *arrays))
+        mesh.refCount += 1
+        return mesh
+
+    @classmethod
+    def meshLoaded(cls, mesh, vertices, indices):
+        """
+        Hand generated arrays to their mesh, on the render thread
+
+        :return: bytes uploaded
+        """
+        if cls.meshes.get(mesh.key) is not mesh:
+            return 0  # released while it was generated
+        mesh.setArrays(vertices, indices)
+        if mesh.pendingShaderProg is None:
+            return 0
+        mesh.initialize(mesh.pendingShaderProg)
+        mesh.pendingShaderProg = None
+        return vertices.nbytes + np.asarray(indices).nbytes
+
+    @classmethod
+    def release(cls, mesh):
+        """
+        Drop one reference to mesh. Once no Displayable holds it, it leaves the registry and its GPU
+        resources are freed.
+        """
+        mesh.refCount -= 1
+        if mesh.refCount <= 0 and cls.meshes.get(mesh.key) is mesh:
+            del cls.meshes[mesh.key]
+            mesh.delete()
+
+    @classmethod
+    def contextLost(cls):
+        """
+        Forget the GL objects of every cached mesh after the GL context was recreated, their names are not valid
+        anymore. Meshes are uploaded again by their next initialize, into new objects or the new arena
+        """
+        cls.arena = None
+        for mesh in cls.meshes.values():
+            mesh.vao, mesh.vbo, mesh.ebo = None, None, None
+            mesh.arena = None
+            mesh.allocation = None
+            mesh.initialized = False
+
+    @classmethod
+    def getArena(cls, mesh, shaderProg):
+        """
+        The arena mesh should be uploaded to, or None if it keeps its own buffers: the arena is off,
+        the compact layout is used, or the mesh is too large for 16 bits indices
+        """
+        if not cls.useArena or mesh.compactVertices:
+            return None
+        if cls.arena is None:
+            # no color pointer, the color is set per draw
+            cls.arena = MeshArena(11, [(shaderProg.getAttribLocation("vertexPos"), 0, 3),
+                                       (shaderProg.getAttribLocation("vertexNormal"), 3, 3),
+                                       (shaderProg.getAttribLocation("vertexTexture"), 9, 2)])
+        return cls.arena if cls.arena.fits(mesh.vertices, mesh.indices) else None
+
+    @classmethod
+    def loadOrGenerate(cls, key, generateFunc):
+        """
+        Read the arrays for key from the disk cache, memory-mapped, or generate and store them on a miss.
+        Keys whose parameters cannot be described stably across runs (e.g. functions) skip the disk cache.
+        """
+        digest = cls.diskDigest(key) if cls.diskCacheDir is not None else None
+        if digest is None:
+            return cls.generate(key, generateFunc)
+
+        verticesPath = os.path.join(cls.diskCacheDir, digest + ".vertices.npy")
+        indicesPath = os.path.join(cls.diskCacheDir, digest + ".indices.npy")
+        if os.path.isfile(verticesPath) and os.path.isfile(indicesPath):
+            try:
+                arrays = np.load(verticesPath, mmap_mode="r"), np.load(indicesPath, mmap_mode="r")
+                for path in (verticesPath, indicesPath):
+                    os.utime(path)  # recently used, trimDiskCache deletes it last
+                return arrays
+            except (OSError, ValueError):
+                pass  # damaged or just trimmed entry, generate it again
+
+        vertices, indices = cls.generate(key, generateFunc)
+        for path, array in ((verticesPath, vertices), (indicesPath, indices)):
+            # write aside and rename, so a concurrent reader never sees a partial file
+            tmpPath = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmpPath, "wb") as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmpPath, path)
+        cls.trimDiskCache()
+        return vertices, indices
+
+    @classmethod
+    def trimDiskCache(cls):
+        """
+        Delete the least recently used entries until the disk cache fits in diskCacheMaxBytes
+        """
+        entries = {}  # digest -> [last use, bytes, paths]
+        for entry in os.scandir(cls.diskCacheDir):
+            if not entry.name.endswith(".npy"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue  # deleted meanwhile
+            digest = entry.name.split(".", 1)[0]
+            record = entries.setdefault(digest, [0, 0, []])
+            record[0] = max(record[0], stat.st_mtime)
+            record[1] += stat.st_size
+            record[2].append(entry.path)
+        totalBytes = sum(record[1] for record in entries.values())
+        for lastUse, byteCount, paths in sorted(entries.values()):
+            if totalBytes <= cls.diskCacheMaxBytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # still memory-mapped on Windows, or trimmed by another thread
+            totalBytes -= byteCount
+
+    @classmethod
+    def generate(cls, key, generateFunc):
+        """
+        Run generateFunc and reorder its triangles for the vertex cache, strips are kept as generated.
+        The ACMR of every mesh goes to acmrReport
+        """
+        vertices, indices = generateFunc()
+        if np.ndim(indices) == 1:
+            before = after = MeshOptimizer.acmr(indices, restartIndex=EBO.primitiveRestart)
+        else:
+            indices = np.asarray(indices).reshape(-1, 3)
+            before = after = MeshOptimizer.acmr(indices)
+            if cls.optimizeVertexCache and before >= cls.optimizeMinACMR:
+                optimized = MeshOptimizer.optimizeVertexCache(indices, len(vertices))
+                optimizedACMR = MeshOptimizer.acmr(optimized)
+                if optimizedACMR < before:
+                    indices, after = optimized, optimizedACMR
+        cls.acmrReport[key] = (before, after)
+        if cls.debug > 0:
+            print(f"{key[0].__name__}{key[1]}: ACMR {before:.3f} -> {after:.3f}")
+        return vertices, indices
+
+    @classmethod
+    def diskDigest(cls, key):
+        """
+        Hash of the key and of the generator source code, or None if the key is not made of plain values
+        """
+        displayableClass, params = key
+        if not cls.isPlain(params):
+            return None
+        if displayableClass not in cls.codeVersions:
+            sources = hashlib.sha1()
+            files = [inspect.getfile(c) for c in inspect.getmro(displayableClass) if c is not object]
+            # the optimizer, the restart index and strip layout of GLBuffer and the vertex formats shape the arrays too
+            for path in files + [MeshOptimizer.__file__, GLBuffer.__file__, VertexFormat.__file__]:
+                with open(path, "rb") as f:
+                    sources.update(f.read())
+            cls.codeVersions[displayableClass] = sources.hexdigest()
+        optimizeSettings = (cls.optimizeVertexCache, cls.optimizeMinACMR)
+        description = repr((displayableClass.__module__, displayableClass.__qualname__, params,
+                            optimizeSettings, cls.codeVersions[displayableClass]))
+        return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def isPlain(cls, value):
+        if isinstance(value, (tuple, list)):
+            return all(cls.isPlain(v) for v in value)
+        return isinstance(value, (int, float, str, bool, type(None)))
@@ -0,0 +1,105 @@
+"""
+Define the precomputed mip chain of textures here.
+The chain is built once with a vectorized box filter and stored next to the image as <image>.mip<maxSize>.npy,
+later loads memory-map it and upload every level as is.
+File layout: a flat uint8 array, width and height of level 0 as two little endian uint32, then every level
+from the largest, RGB rows bottom row first (already flipped for OpenGL).
+First version in 10/18/2026
+
+:version: 2026.1.1
+"""
+
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+HEADER_BYTES = 8
+
+
+def levelSizes(width, height):
+    """
+    :return: (width, height) of every level, halved (rounded down, at least 1) down to 1 x 1
+    """
+    sizes = [(width, height)]
+    while width > 1 or height > 1:
+        width, height = max(1, width // 2), max(1, height // 2)
+        sizes.append((width, height))
+    return sizes
+
+
+def buildMipChain(image):
+    """
+    Average every 2 x 2 block into the next level. An odd last row or column is left out.
+
+    :param image: uint8 array of shape (height, width, 3)
+    :return: list of uint8 arrays of shape (height, width, 3), largest first
+    """
+    levels = [np.ascontiguousarray(image, dtype=np.uint8)]
+    level = levels[0].astype(np.float32)
+    for width, height in levelSizes(image.shape[1], image.shape[0])[1:]:
+        if level.shape[0] > 1:
+            level = level[:2 * height].reshape(height, 2, level.shape[1], 3).mean(axis=1)
+        if level.shape[1] > 1:
+            level = level[:, :2 * width].reshape(height, width, 2, 3).mean(axis=2)
+        levels.append(np.rint(level).astype(np.uint8))
+    return levels
+
+
+def cachePath(imagePath, maxSize):
+    return f"{imagePath}.mip{maxSize}.npy"
+
+
+def loadMipChain(imagePath, maxSize):
+    """
+    Read the mip chain of an image, memory-mapped, building and storing it first if missing or older than the image
+
+    :param maxSize: the largest level is downscaled to fit in maxSize x maxSize
+    :return: list of uint8 arrays of shape (height, width, 3), largest first, bottom row first
+    """
+    path = cachePath(imagePath, maxSize)
+    if os.path.isfile(path) and os.path.getmtime(path) >= os.path.getmtime(imagePath):
+        try:
+            return splitLevels(np.load(path, mmap_mode="r"))
+        except (OSError, ValueError):
+            pass  # damaged file, build it again
+
+    with Image.open(imagePath) as image:
+        image = image.convert("RGB")
+        if max(image.size) > maxSize:
+            scale = maxSize / max(image.size)
+            image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                                 Image.LANCZOS)
+        pixels = np.asarray(image, dtype=np.uint8)[::-1]
+    levels = buildMipChain(pixels)
+
+    header = np.array([pixels.shape[1], pixels.shape[0]], dtype="<u4").view(np.uint8)
+    data = np.concatenate([header] + [level.reshape(-1) for level in levels])
+    tmpPath = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        # write aside and rename, so a concurrent reader never sees a partial file
+        with open(tmpPath, "wb") as f:
+            np.save(f, data)
+        os.replace(tmpPath, path)
+    except OSError:
+        # e.g. a read-only asset directory, use the chain without storing it
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+    return levels
+
+
+def splitLevels(data):
+    """
+    Views of every level in the flat array of a stored chain
+    """
+    width, height = (int(x) for x in data[:HEADER_BYTES].view("<u4"))
+    levels = []
+    offset = HEADER_BYTES
+    for levelWidth, levelHeight in levelSizes(width, height):
+        size = levelWidth * levelHeight * 3
+        levels.append(data[offset:offset + size].reshape(levelHeight, levelWidth, 3))
+        offset += size
+    if offset != data.size:
+        raise ValueError("Mip chain file size doesn't match its header")
+    return levels
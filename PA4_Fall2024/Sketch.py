@@ -16,12 +16,16 @@ import numpy as np
 import ColorType
 from Animation import Animation
 from ModelAxes import ModelAxes
+from Component import Component
 from PA4_Fall2024.SceneThree import SceneThree
 from PA4_Fall2024.SceneTwo import SceneTwo
 from Point import Point
 from CanvasBase import CanvasBase
 from GLProgram import GLProgram
-from GLBuffer import VAO, VBO, EBO, Texture
+from GLBuffer import VAO, VBO, EBO, Texture, GLResources, GLState, TextureUnits
+from AssetLoader import AssetLoader
+from MeshCache import MeshCache
+from TextureCache import TextureCache
 import GLUtility
 from SceneOne import SceneOne
 
@@ -108,6 +112,9 @@ class Sketch(CanvasBase):
     glutility = None
 
     frameCount = 0
+    glCallCounts = (0, 0)  # (issued, skipped) binds and program switches of the last frame, see GLState
+    uniformCounts = (0, 0)  # (uploaded, skipped) uniform values of the last frame, see GLProgram.uniformChanged
+    meshDiskCache = False  # keep generated meshes in the user's cache directory, later launches memory-map them
 
     lookAtPt = None
     upVector = None
@@ -169,10 +176,25 @@ class Sketch(CanvasBase):
         self.topLevelComponent.clear()
         self.topLevelComponent.addChild(self.scene)
         self.topLevelComponent.initialize()
+        if self.debug > 0:
+            print("Live GL objects:", GLResources.summary())
 
     def InitGL(self):
+        # OnResize creates a new context, objects cached from the previous one must be uploaded again
+        GLResources.contextLost()
+        MeshCache.contextLost()
+        TextureCache.contextLost()
+        # decode images and generate meshes in the background, uploads are drained in OnDraw
+        AssetLoader.start()
+
         self.shaderProg = GLProgram()
         self.shaderProg.compile()
+        # texture arrays have a unit of their own, see TextureUnits
+        self.shaderProg.setInt("textureArray", TextureUnits.arrayUnit)
+
+        MeshCache.debug = self.debug
+        if self.meshDiskCache:
+            MeshCache.setDiskCache(MeshCache.userCacheDir())
 
         # instantiate models, then can only be done with a compiled GL program
         self.basisAxes = ModelAxes(self.shaderProg, Point((0, 0, 0)))
@@ -230,11 +252,15 @@ class Sketch(CanvasBase):
         self.OnDraw()
 
     def OnDraw(self):
+        AssetLoader.drain()
+        TextureCache.enforceBudget()
+
         gl.glClearColor(*self.backgroundColor, 1.0)
         gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
 
         self.viewMat = self.glutility.view(self.getCameraPos(), self.lookAtPt, self.upVector)
         self.shaderProg.setMat4("viewMat", self.viewMat)
+        Component.setLODView(self.getCameraPos(), self.perspMat[1, 1] * self.size.height / 2)
         self.shaderProg.setVec3("viewPosition", np.array(self.getCameraPos()))
         if self.ImageModeOn:
             self.shaderProg.setVec3("iResolution", np.array((float(self.size.width), float(self.size.height), 1.0)))
@@ -251,6 +277,13 @@ class Sketch(CanvasBase):
         self.basisAxes.setCurrentPosition(resultPt)
         self.basisAxes.draw(self.shaderProg)
 
+        self.glCallCounts = GLState.counters(reset=True)
+        self.uniformCounts = self.shaderProg.uniformCounts(reset=True)
+        if self.debug > 1:
+            uploaded, skipped = self.uniformCounts
+            print("GL binds issued, skipped:", self.glCallCounts,
+                  f"uniforms uploaded, skipped: {self.uniformCounts} "
+                  f"({skipped / max(1, uploaded + skipped):.0%} hits)")
         self.SwapBuffers()
 
     def OnDestroy(self, event):
@@ -260,6 +293,7 @@ class Sketch(CanvasBase):
         :param event: Window destroy event
         :return: None
         """
+        AssetLoader.stop()
         if self.shaderProg is not None:
             del self.shaderProg
         super(Sketch, self).OnDestroy(event)
@@ -0,0 +1,252 @@
+"""
+Define the packing of textures into texture arrays here.
+Square power of two images share one GL_TEXTURE_2D_ARRAY per size, one image per layer.
+Other images are shelf-packed into the layers of an atlas array, the shader maps texture coordinates into their cell.
+Arrays start as small as their first image allows and grow on demand, an empty array is deleted.
+Objects textured from the same array draw without any texture bind in between, only a layer and a rectangle change.
+First version in 10/18/2026
+
+:version: 2026.1.1
+"""
+
+from GLBuffer import Texture, TextureArray
+
+
+class ArraySlot:
+    """
+    An image stored in a TextureArray: a whole layer, or a cell of an atlas layer.
+    Drawn with bindProgram / unbindProgram like a Texture.
+    """
+    key = None  # TextureCache key
+    array = None  # TextureArray holding the image, None until placed
+    layer = 0
+    rect = (0.0, 0.0, 1.0, 1.0)  # offset and size of the image in its layer, in texture coordinates
+    cell = None  # (x, y, width, height) in texels of the atlas cell, None for a whole layer
+    levels = None  # mip chain, kept to upload again when its array is reallocated
+    texture = None  # stand-alone Texture for an image too large for the atlas
+    byteLength = 0  # the slot owns no GPU memory, its array is counted by TextureArrays.residentBytes
+
+    def bindProgram(self, shaderProg):
+        """
+        Texture the next draws of shaderProg, which must be in use
+        """
+        if self.texture is not None:
+            self.texture.bindProgram(shaderProg)
+            return
+        if self.array is None:
+            self.unbindProgram(shaderProg)  # not loaded yet
+            return
+        self.array.bind()
+        shaderProg.setBool("textureArrayOn", True)
+        shaderProg.setFloat("textureLayer", self.layer)
+        shaderProg.setVec4("textureRect", self.rect)
+
+    def unbindProgram(self, shaderProg):
+        shaderProg.setBool("textureArrayOn", False)
+        shaderProg.setInt("textureImage", 0)
+
+    def delete(self):
+        """
+        Give back the layer or cell, the slot is empty afterwards
+        """
+        TextureArrays.remove(self)
+
+
+class TextureArrays:
+    """
+    Registry of the texture arrays and of the slots placed in them.
+    Arrays start with one layer and are reallocated with twice as many when full. The atlas also starts only as
+    large as its first cell, and doubles its width or height, up to atlasMaxSize, before taking a new layer.
+    OpenGL 3.3 can't copy between textures, so a reallocation uploads every slot again from its memory-mapped
+    mip chain.
+    """
+    arrays = {}  # (width, height) of layer arrays, or "atlas" -> TextureArray
+    slots = {}  # same keys -> list of slots placed in that array, "texture" -> slots with a stand-alone Texture
+    freeLayers = {}  # layer array key -> layers given back
+    shelves = []  # per atlas layer, shelves as [y, height, x of the next cell]
+    atlasWidth = 0  # size of the atlas layers, 0 until the first cell
+    atlasHeight = 0
+
+    initialLayers = 1
+    atlasMaxSize = 2048
+    atlasAlignment = 64  # atlas cells start on multiples of this, so their mip levels down to 64 x smaller line up
+
+    @classmethod
+    def place(cls, slot, levels):
+        """
+        Upload a loaded mip chain to a free layer or atlas cell, on the render thread
+
+        :return: bytes uploaded
+        """
+        height, width, _ = levels[0].shape
+        slot.levels = levels
+        if width == height and width & (width - 1) == 0:
+            return cls.placeLayer(slot, (width, height))
+        cellWidth, cellHeight = cls.alignUp(width), cls.alignUp(height)
+        if cellWidth > cls.atlasMaxSize or cellHeight > cls.atlasMaxSize:
+            slot.texture = Texture()
+            slot.texture.setMipChain(levels)
+            cls.slots.setdefault("texture", []).append(slot)
+            return sum(level.nbytes for level in levels)
+        return cls.placeCell(slot, cellWidth, cellHeight)
+
+    @classmethod
+    def placeLayer(cls, slot, size):
+        free = cls.freeLayers.setdefault(size, [])
+        slots = cls.slots.setdefault(size, [])
+        layer = free.pop() if free else len(slots)
+        array = cls.reserve(size, layer + 1, size[0], size[1], None)
+        slot.array, slot.layer, slot.rect, slot.cell = array, layer, (0.0, 0.0, 1.0, 1.0), None
+        slots.append(slot)
+        return array.setLayer(layer, slot.levels)
+
+    @classmethod
+    def placeCell(cls, slot, cellWidth, cellHeight):
+        if not cls.shelves:
+            cls.atlasWidth, cls.atlasHeight = cls.powerOfTwo(cellWidth), cls.powerOfTwo(cellHeight)
+            cls.shelves.append([])
+        # first shelf tall enough with room left, else a new shelf, else a larger atlas, else a new layer
+        while True:
+            position = None
+            for layer, shelves in enumerate(cls.shelves):
+                position = cls.shelfFit(shelves, cellWidth, cellHeight)
+                if position is not None:
+                    break
+            if position is not None or not cls.growAtlas(cellWidth, cellHeight):
+                break
+        if position is None:
+            layer = len(cls.shelves)
+            cls.shelves.append([])
+            position = cls.shelfFit(cls.shelves[layer], cellWidth, cellHeight)
+        x, y = position
+
+        slot.layer, slot.cell = layer, (x, y, cellWidth, cellHeight)
+        cls.slots.setdefault("atlas", []).append(slot)
+        array = cls.reserve("atlas", len(cls.shelves), cls.atlasWidth, cls.atlasHeight,
+                            cls.atlasAlignment.bit_length())
+        if slot.array is array:
+            return 0  # the reallocation already uploaded it
+        slot.array = array
+        cls.setCellRect(slot)
+        return array.setLayer(layer, slot.levels, x, y)
+
+    @classmethod
+    def shelfFit(cls, shelves, cellWidth, cellHeight):
+        """
+        Take a cell in a layer's shelves, adding a shelf if needed
+
+        :return: (x, y) of the cell, None if the layer is full
+        """
+        for shelf in shelves:
+            y, height, nextX = shelf
+            if cellHeight <= height and nextX + cellWidth <= cls.atlasWidth:
+                shelf[2] += cellWidth
+                return nextX, y
+        top = shelves[-1][0] + shelves[-1][1] if shelves else 0
+        if top + cellHeight > cls.atlasHeight or cellWidth > cls.atlasWidth:
+            return None
+        shelves.append([top, cellHeight, cellWidth])
+        return 0, top
+
+    @classmethod
+    def growAtlas(cls, cellWidth, cellHeight):
+        """
+        Double the atlas width or height, the one the cell needs or else the smaller one.
+        Cells already placed keep their texel position.
+
+        :return: False if the atlas is already at its largest
+        """
+        widthRoom, heightRoom = cls.atlasWidth < cls.atlasMaxSize, cls.atlasHeight < cls.atlasMaxSize
+        if widthRoom and (cellWidth > cls.atlasWidth or not heightRoom or cls.atlasWidth <= cls.atlasHeight):
+            cls.atlasWidth *= 2
+        elif heightRoom:
+            cls.atlasHeight *= 2
+        else:
+            return False
+        return True
+
+    @classmethod
+    def setCellRect(cls, slot):
+        x, y, _, _ = slot.cell
+        height, width, _ = slot.levels[0].shape
+        # half a texel in from the edges, so filtering doesn't reach the padding around the image
+        slot.rect = ((x + 0.5) / cls.atlasWidth, (y + 0.5) / cls.atlasHeight,
+                     (width - 1) / cls.atlasWidth, (height - 1) / cls.atlasHeight)
+
+    @classmethod
+    def alignUp(cls, length):
+        return -(-length // cls.atlasAlignment) * cls.atlasAlignment
+
+    @classmethod
+    def powerOfTwo(cls, length):
+        return max(cls.atlasAlignment, 1 << (length - 1).bit_length())
+
+    @classmethod
+    def reserve(cls, arrayKey, layerNum, width, height, levelCount):
+        """
+        Get the array for arrayKey with at least layerNum layers of width x height,
+        reallocating it and uploading its slots again if it is too small
+        """
+        array = cls.arrays.get(arrayKey)
+        if array is not None and array.layerCount >= layerNum and (array.width, array.height) == (width, height):
+            return array
+        layerCount = cls.initialLayers if array is None else array.layerCount
+        while layerCount < layerNum:
+            layerCount *= 2
+        newArray = TextureArray(width, height, layerCount, levelCount)
+        cls.arrays[arrayKey] = newArray
+        for slot in cls.slots.get(arrayKey, []):
+            slot.array = newArray
+            if slot.cell is not None:
+                cls.setCellRect(slot)
+            newArray.setLayer(slot.layer, slot.levels, *(slot.cell or (0, 0))[:2])
+        if array is not None:
+            array.delete()
+        return newArray
+
+    @classmethod
+    def residentBytes(cls):
+        """
+        GPU memory of every array and of the stand-alone textures
+        """
+        return (sum(array.byteLength for array in cls.arrays.values()) +
+                sum(slot.texture.byteLength for slot in cls.slots.get("texture", [])))
+
+    @classmethod
+    def remove(cls, slot):
+        """
+        Give back the layer or cell of a slot. An atlas layer is reused once all its cells are given back,
+        an array is deleted once all its slots are.
+        """
+        if slot.texture is not None:
+            cls.slots["texture"].remove(slot)
+            slot.texture.delete()
+        elif slot.array is not None:
+            arrayKey = "atlas" if slot.cell is not None else (slot.array.width, slot.array.height)
+            slots = cls.slots[arrayKey]
+            slots.remove(slot)
+            if not slots:
+                cls.arrays.pop(arrayKey).delete()
+                cls.freeLayers.pop(arrayKey, None)
+                if arrayKey == "atlas":
+                    cls.shelves = []
+                    cls.atlasWidth = cls.atlasHeight = 0
+            elif slot.cell is None:
+                cls.freeLayers[arrayKey].append(slot.layer)
+            elif not any(s.layer == slot.layer for s in slots):
+                cls.shelves[slot.layer] = []
+        slot.array, slot.texture, slot.levels = None, None, None
+
+    @classmethod
+    def contextLost(cls):
+        """
+        Forget every array of the previous GL context, slots still held are left empty
+        """
+        for slots in cls.slots.values():
+            for slot in slots:
+                slot.array, slot.texture, slot.levels = None, None, None
+        cls.arrays.clear()
+        cls.slots.clear()
+        cls.freeLayers.clear()
+        cls.shelves = []
+        cls.atlasWidth = cls.atlasHeight = 0
@@ -0,0 +1,211 @@
+"""
+Define a process-wide texture registry here.
+Components texturing with the same image file share one decoded image and one GL texture.
+Images are loaded through their precomputed mip chain, see MipChain.
+With useTextureArrays, they are packed into texture arrays instead of one texture each, see TextureArrays.
+With a budgetBytes, textures not drawn lately lose their top mip levels, then their whole storage, to keep GPU memory
+under budget, and are streamed back from their mip chain file when drawn again.
+First version in 10/18/2026
+
+:version: 2026.1.1
+"""
+
+import collections
+import os
+
+import MipChain
+from AssetLoader import AssetLoader
+from GLBuffer import Texture
+from TextureArrays import ArraySlot, TextureArrays
+
+
+class TextureCache:
+    """
+    Registry of shared textures, keyed by (absolute path, file modification time, upload options).
+    A texture nobody holds anymore is kept for reuse, the least recently used of them are deleted
+    once there are more than maxUnreferenced.
+    Residency: touch marks a texture drawn in the current frame, enforceBudget ends the frame and frees the least
+    recently drawn textures until the textures fit in budgetBytes. Textures drawn or acquired in the last graceFrames
+    frames are never freed, so a scene whose visible textures alone exceed the budget goes over it rather than thrash.
+    Texture arrays count toward the budget, but only shrink when the images they hold are evicted, see TextureArrays.
+    """
+    textures = {}  # key -> Texture or ArraySlot, referenced or not
+    refCounts = {}  # key -> number of holders
+    unreferenced = collections.OrderedDict()  # keys with no holder, least recently released first
+
+    maxUnreferenced = 8
+    maxTextureSize = 1024  # larger images are downscaled to fit, before their mip chain is built
+    useTextureArrays = False  # pack images into texture arrays, objects sharing an array draw without texture binds
+
+    budgetBytes = None  # GPU memory allowed to textures, no limit if None
+    graceFrames = 30
+    maxLevelDrop = 2  # top mip levels dropped before a texture is freed entirely, each one saves 3 / 4 of the rest
+    frame = 0
+    lastDrawn = collections.OrderedDict()  # key -> frame it was last drawn in, least recently drawn first
+    levelDrops = {}  # key -> top mip levels left out of the upload, missing while the texture is freed
+    streaming = set()  # keys whose mip chain is being loaded
+
+    @classmethod
+    def acquire(cls, imgFilePath, maxSize=None):
+        """
+        Get the texture for an image file and take a reference to it. The file is only decoded and uploaded
+        on the first request, or when it changed on disk.
+        Once AssetLoader is started, decoding runs in the background and the texture stays empty
+        until AssetLoader.drain uploads it.
+
+        :param imgFilePath: path of the image file
+        :param maxSize: largest width or height uploaded, TextureCache.maxTextureSize if not given
+        :return: a Texture, or an ArraySlot with useTextureArrays, both drawn with bindProgram
+        """
+        path = os.path.abspath(imgFilePath)
+        maxSize = cls.maxTextureSize if maxSize is None else maxSize
+        key = (path, os.path.getmtime(path), maxSize)
+        texture = cls.textures.get(key)
+        if texture is None:
+            texture = ArraySlot() if cls.useTextureArrays else Texture()
+            texture.key = key
+            cls.textures[key] = texture
+            cls.refCounts[key] = 0
+            cls.levelDrops[key] = 0
+            cls.stream(texture)
+        cls.unreferenced.pop(key, None)
+        cls.refCounts[key] += 1
+        # acquired counts as drawn, a texture loaded for a new scene is in its grace window until first drawn
+        cls.lastDrawn[key] = cls.frame
+        cls.lastDrawn.move_to_end(key)
+        return texture
+
+    @classmethod
+    def stream(cls, texture):
+        """
+        Load the mip chain of a texture, through AssetLoader, and upload the levels levelDrops asks for
+        """
+        path, _, maxSize = texture.key
+        cls.streaming.add(texture.key)
+        AssetLoader.submit(lambda: MipChain.loadMipChain(path, maxSize),
+                           lambda levels: cls.textureLoaded(texture, levels))
+
+    @classmethod
+    def textureLoaded(cls, texture, levels):
+        """
+        Upload a loaded mip chain to its texture, on the render thread
+
+        :return: bytes uploaded
+        """
+        if cls.textures.get(texture.key) is not texture:
+            return 0  # evicted or context lost while it was loaded
+        cls.streaming.discard(texture.key)
+        if isinstance(texture, ArraySlot):
+            return TextureArrays.place(texture, levels)
+        if texture.key not in cls.levelDrops:
+            return 0  # freed while it was loaded
+        levels = levels[min(cls.levelDrops[texture.key], len(levels) - 1):]
+        texture.setMipChain(levels)
+        return sum(level.nbytes for level in levels)
+
+    @classmethod
+    def touch(cls, texture):
+        """
+        Record that texture is drawn in this frame, streaming it back at full resolution if it was reduced or freed
+        """
+        key = texture.key
+        if cls.textures.get(key) is not texture or isinstance(texture, ArraySlot):
+            return
+        cls.lastDrawn[key] = cls.frame
+        cls.lastDrawn.move_to_end(key)
+        if cls.levelDrops.get(key) != 0 and key not in cls.streaming:
+            cls.levelDrops[key] = 0
+            cls.stream(texture)
+
+    @classmethod
+    def residentBytes(cls):
+        return (sum(texture.byteLength for texture in cls.textures.values() if isinstance(texture, Texture)) +
+                TextureArrays.residentBytes())
+
+    @classmethod
+    def enforceBudget(cls):
+        """
+        End the frame: free textures not drawn in the last graceFrames frames, least recently drawn first,
+        until the textures fit in budgetBytes. Unreferenced textures are evicted, the others first lose
+        their top mip levels one at a time, down to maxLevelDrop, then their whole storage.
+        Nothing is freed while mip chains are streamed, the bytes they will take or free aren't known yet.
+        Call once per frame on the render thread.
+        """
+        cls.frame += 1
+        if cls.budgetBytes is None or cls.streaming:
+            return
+        excess = cls.residentBytes() - cls.budgetBytes
+        if excess <= 0:
+            return
+
+        # an evicted array slot frees nothing until its array empties, so measure again after each eviction
+        for key in list(cls.unreferenced):
+            cls.evict(key)
+            excess = cls.residentBytes() - cls.budgetBytes
+            if excess <= 0:
+                return
+
+        candidates = [key for key, frame in cls.lastDrawn.items() if cls.frame - frame > cls.graceFrames]
+        for dropAll in (False, True):
+            for key in candidates:
+                texture = cls.textures.get(key)
+                if texture is None or not texture.byteLength or key in cls.streaming:
+                    continue
+                if dropAll or cls.levelDrops[key] >= cls.maxLevelDrop:
+                    excess -= texture.byteLength
+                    texture.delete()
+                    del cls.levelDrops[key]
+                else:
+                    # each dropped level leaves a quarter of the bytes, the smaller upload comes later from drain
+                    excess -= texture.byteLength * 3 // 4
+                    cls.levelDrops[key] += 1
+                    cls.stream(texture)
+                if excess <= 0:
+                    return
+
+    @classmethod
+    def release(cls, texture):
+        """
+        Drop one reference to texture. It stays cached, unreferenced, until evicted.
+        """
+        key = texture.key
+        if cls.textures.get(key) is not texture:
+            return
+        cls.refCounts[key] -= 1
+        if cls.refCounts[key] <= 0:
+            cls.unreferenced[key] = None
+            while len(cls.unreferenced) > cls.maxUnreferenced:
+                cls.evict(next(iter(cls.unreferenced)))
+
+    @classmethod
+    def evict(cls, key):
+        cls.unreferenced.pop(key, None)
+        cls.lastDrawn.pop(key, None)
+        cls.levelDrops.pop(key, None)
+        cls.streaming.discard(key)
+        del cls.refCounts[key]
+        cls.textures.pop(key).delete()
+
+    @classmethod
+    def contextLost(cls):
+        """
+        Drop every cached texture after the GL context was recreated, their names are not valid anymore.
+        Textures still held are left empty, releasing them is a no-op.
+        """
+        for texture in cls.textures.values():
+            texture.textureName = 0
+        TextureArrays.contextLost()
+        cls.textures.clear()
+        cls.refCounts.clear()
+        cls.unreferenced.clear()
+        cls.lastDrawn.clear()
+        cls.levelDrops.clear()
+        cls.streaming.clear()
+
+    @classmethod
+    def clear(cls):
+        """
+        Delete every unreferenced texture
+        """
+        for key in list(cls.unreferenced):
+            cls.evict(key)
@@ -0,0 +1,52 @@
+"""
+Define packed vertex layouts here.
+The default layout is eleven float32 per vertex: position(3) + normal(3) + color(3) + texture coordinate(2), 44 bytes.
+The compact layout stores position as float32, normal as GL_INT_2_10_10_10_REV, texture coordinate as half floats,
+and color either as normalized bytes or, when the whole mesh has one color, not at all (20 bytes per vertex).
+First version in 10/18/2026
+
+:version: 2026.1.1
+"""
+
+import numpy as np
+
+# every field starts on a 4 bytes boundary, so offsets and strides can still be counted in 4 bytes words
+COMPACT_FIELDS = [("position", "<f4", (3,)), ("normal", "<u4"), ("texture", "<f2", (2,))]
+COMPACT_DTYPE = np.dtype(COMPACT_FIELDS)
+COMPACT_COLOR_DTYPE = np.dtype(COMPACT_FIELDS + [("color", "u1", (4,))])
+
+
+def packNormals(normals):
+    """
+    Pack unit normals into GL_INT_2_10_10_10_REV words: x in bits 0-9, y in 10-19, z in 20-29, w = 0
+
+    :param normals: array of shape (n, 3), components in [-1, 1]
+    :return: uint32 array of shape (n,)
+    """
+    signed = np.rint(np.clip(normals, -1, 1) * 511).astype(np.int32)
+    bits = (signed & 0x3FF).astype(np.uint32)
+    return bits[:, 0] | (bits[:, 1] << 10) | (bits[:, 2] << 20)
+
+
+def packCompact(vertices):
+    """
+    Convert the eleven float layout into the compact layout
+
+    :param vertices: array of shape (n, 11)
+    :return: (packed structured array, constant color or None). If every vertex has the same color it is
+             returned separately and left out of the packed array, to be set once per draw
+    """
+    color = vertices[:, 6:9]
+    constantColor = None
+    if len(vertices) > 0 and np.all(color == color[0]):
+        constantColor = tuple(float(c) for c in color[0])
+        packed = np.empty(len(vertices), dtype=COMPACT_DTYPE)
+    else:
+        packed = np.empty(len(vertices), dtype=COMPACT_COLOR_DTYPE)
+        packed["color"][:, 0:3] = np.rint(np.clip(color, 0, 1) * 255)
+        packed["color"][:, 3] = 255
+
+    packed["position"] = vertices[:, 0:3]
+    packed["normal"] = packNormals(vertices[:, 3:6])
+    packed["texture"] = vertices[:, 9:11]
+    return packed, constantColor